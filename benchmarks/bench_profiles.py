@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Speed and accuracy of the quality profiles on a synthetic corpus.
+
+The corpus is click tracks (decaying noise bursts on every beat over a noise
+floor) at tempos across the default range, including fractional ones. Run
+from the repository root:
+
+    python benchmarks/bench_profiles.py [--tracks 24] [--duration 30]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+# The test suite's signal generators (tests/signals.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+from bpm_detector.detector import BPMDetector  # noqa: E402
+from bpm_detector.profiles import PROFILES  # noqa: E402
+from bpm_detector.registry import get_spec  # noqa: E402
+from signals import make_click_track  # noqa: E402
+
+def make_corpus(count, duration, sample_rate):
+    rng = np.random.default_rng(0)
+    tempos = rng.uniform(95, 180, count).round(1)
+    return [(bpm, make_click_track(bpm, duration, sample_rate, seed))
+            for seed, bpm in enumerate(tempos)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tracks", type=int, default=24, help="Tracks in the corpus")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per track")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.tracks, args.duration, args.sample_rate)
+    print(f"{args.tracks} tracks of {args.duration:.0f}s at {args.sample_rate} Hz\n")
+    print(f"{'profile':<10}{'ms/track':>10}  {'algorithm':<16}{'within 1 BPM':>13}"
+          f"{'within 0.2':>11}{'mean error':>11}")
+    for name in PROFILES:
+        detector = BPMDetector(profile=name)
+        detector.detect_all(corpus[0][1], args.sample_rate)  # Warm the plan cache
+        times = []
+        errors = {}
+        for bpm, audio in corpus:
+            start = time.perf_counter()
+            results = detector.detect_all(audio, args.sample_rate)
+            times.append(time.perf_counter() - start)
+            for key, result in results.items():
+                errors.setdefault(get_spec(key).name, []).append(abs(result.bpm - bpm))
+        for i, (algorithm, errs) in enumerate(errors.items()):
+            errs = np.array(errs)
+            speed = f"{statistics.median(times) * 1000:>10.0f}" if i == 0 else " " * 10
+            print(f"{name if i == 0 else '':<10}{speed}  {algorithm:<16}"
+                  f"{np.mean(errs <= 1.0):>13.0%}{np.mean(errs <= 0.2):>11.0%}"
+                  f"{np.mean(errs):>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: wall time and heavy modules loaded by common entry points.
+
+Each scenario runs in a fresh interpreter, so the numbers include interpreter
+start-up. Run from the repository root:
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+HEAVY_MODULES = ["numpy", "scipy.signal", "scipy.stats", "soundfile", "PyQt6.QtWidgets"]
+
+SCENARIOS = {
+    "python (baseline)": "pass",
+    "import bpm_detector": "import bpm_detector",
+    "bpm-detector --help": (
+        "import sys; sys.argv = ['bpm-detector', '--help']\n"
+        "from bpm_detector.cli import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    ),
+    "import bpm_detector.detector": "import bpm_detector.detector",
+}
+
+REPORT = "\nimport sys; print(','.join(m for m in {!r} if m in sys.modules), file=sys.stderr)"
+
+def run_scenario(code, runs):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    times = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code + REPORT.format(HEAVY_MODULES)],
+                              env=env, capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+        loaded = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ""
+    return statistics.median(times), loaded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<32}{'median (ms)':>12}  heavy modules loaded")
+    for name, code in SCENARIOS.items():
+        median, loaded = run_scenario(code, args.runs)
+        print(f"{name:<32}{median * 1000:>12.0f}  {loaded or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Handing decoded audio to a worker process: pickling vs shared memory.
+
+Each round sends a stereo float64 track to a warm worker process, which
+reads every sample (a sum) and returns. Pickling copies the samples through
+a pipe; shared memory copies them once into a segment and sends a handle.
+Run from the repository root:
+
+    python benchmarks/bench_transport.py [--minutes 1 5 10] [--rounds 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from bpm_detector.shm import SharedMemoryPool, attach  # noqa: E402
+
+def consume_array(audio):
+    return float(audio.sum())
+
+def consume_shared(handle):
+    with attach(handle) as audio:
+        return float(audio.sum())
+
+def median_seconds(func, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 10],
+                        help="Track lengths to test")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'track':>8}{'MB':>8}{'sum only':>10}{'pickle':>10}{'shared':>10}{'speedup':>9}")
+    with ProcessPoolExecutor(max_workers=1) as executor, SharedMemoryPool() as pool:
+        executor.submit(consume_array, np.zeros(1)).result()  # Start the worker
+        for minutes in args.minutes:
+            audio = rng.standard_normal((int(minutes * 60 * args.sample_rate), 2))
+
+            def pickled():
+                executor.submit(consume_array, audio).result()
+
+            def shared():
+                handle = pool.publish(audio)
+                try:
+                    executor.submit(consume_shared, handle).result()
+                finally:
+                    pool.release(handle)
+
+            baseline = median_seconds(lambda: consume_array(audio), args.rounds)
+            pickle_time = median_seconds(pickled, args.rounds)
+            shared_time = median_seconds(shared, args.rounds)
+            print(f"{minutes:>6.0f} m{audio.nbytes / 1e6:>8.0f}{baseline * 1000:>8.0f}ms"
+                  f"{pickle_time * 1000:>8.0f}ms{shared_time * 1000:>8.0f}ms"
+                  f"{pickle_time / shared_time:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
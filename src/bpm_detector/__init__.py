@@ -2,6 +2,27 @@
 BPM Detector - A Python package for detecting BPM in audio files
 """
 
-from .detector import BPMDetector, BPMAlgorithm
+from importlib import import_module
+from .registry import BPMAlgorithm, register_algorithm
 
-__version__ = "0.1.0"
\ No newline at end of file
+__version__ = "0.1.0"
+
+# Heavy modules (numpy, scipy, soundfile) load on first attribute access
+_LAZY_ATTRIBUTES = {
+    "BPMDetector": ".detector",
+    "BPMResult": ".detector",
+    "SamplingStrategy": ".detector",
+    "analyze_bpm": ".detector",
+}
+
+__all__ = ["BPMAlgorithm", "register_algorithm"] + list(_LAZY_ATTRIBUTES)
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -0,0 +1,398 @@
+"""
+Checkpointed batch analysis driven by an append-only manifest file
+"""
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac")
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+@dataclass
+class BatchProgress:
+    total: int  # Files in the job
+    completed: int  # Files with a result, including earlier runs
+    failed: int  # Files that exhausted their retries
+    remaining: int  # Files still to attempt in this run
+    elapsed: float  # Seconds since this run started
+    files_per_second: float  # Measured throughput of this run
+    eta_seconds: Optional[float]  # None until the first file finishes
+    deduplicated: int = 0  # Files that reused the result of identical audio
+    saved_seconds: float = 0.0  # Analysis time those files would have taken
+
+def iter_audio_files(paths, extensions=AUDIO_EXTENSIONS) -> Iterable[str]:
+    """Yield audio files, expanding directories recursively in sorted order"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(extensions):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def results_to_dict(results) -> Dict[str, dict]:
+    """Serializable form of detect_all results, keyed by algorithm name"""
+    from dataclasses import asdict
+    from .registry import get_spec
+    data = {}
+    for key, result in results.items():
+        data[get_spec(key).name] = {"bpm": result.bpm, "confidence": result.confidence}
+        if result.beat_grid is not None:
+            data[get_spec(key).name]["beat_grid"] = asdict(result.beat_grid)
+    return data
+
+def results_from_dict(data):
+    """Inverse of results_to_dict"""
+    from .detector import BeatGrid, BPMResult
+    from .registry import get_spec
+    return {get_spec(name).key: BPMResult(bpm=value["bpm"], confidence=value["confidence"],
+                                          beat_grid=BeatGrid(**value["beat_grid"])
+                                          if "beat_grid" in value else None)
+            for name, value in data.items()}
+
+class Manifest:
+    """
+    Append-only JSONL log of per-file outcomes.
+
+    Every record is written with a single O_APPEND write, so a crash can at
+    worst leave one truncated final line, which is dropped on the next open.
+    Only the per-path state is kept in memory, not the records themselves;
+    for fingerprints, the offset of the record to reuse is kept and the
+    record is read back with record_at.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.done = set()  # Paths with a successful record
+        self.failures = {}  # Path -> number of failed attempts
+        self.fingerprints = {}  # Audio fingerprint -> offset of its first successful record
+        for offset, record in _read_records(path, repair=True):
+            self._track(record, offset)
+        self._fd = None
+
+    def _track(self, record, offset):
+        if record["status"] == STATUS_OK:
+            self.done.add(record["path"])
+            if record.get("fingerprint"):
+                self.fingerprints.setdefault(record["fingerprint"], offset)
+        else:
+            self.failures[record["path"]] = self.failures.get(record["path"], 0) + 1
+
+    def append(self, record):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        offset = os.fstat(self._fd).st_size
+        os.write(self._fd, (json.dumps(record, sort_keys=True) + "\n").encode("utf-8"))
+        if self.fsync:
+            os.fsync(self._fd)
+        self._track(record, offset)
+
+    def record_at(self, offset) -> dict:
+        """The record starting at a byte offset, as kept in `fingerprints`"""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def read_manifest(path, repair=False) -> Iterable[dict]:
+    """
+    Yield the complete records of a manifest.
+
+    Args:
+        path (str): Manifest file, may be missing
+        repair (bool): Truncate an interrupted final line in place
+    """
+    for _, record in _read_records(path, repair):
+        yield record
+
+def _read_records(path, repair):
+    """(byte offset, record) of the complete records of a manifest"""
+    if not os.path.exists(path):
+        return
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Interrupted write of the final record
+            offset = valid_bytes
+            valid_bytes += len(line)
+            if line.strip():
+                yield offset, json.loads(line)
+    if repair and valid_bytes < os.path.getsize(path):
+        # Cut the file back to the last full record before appending again
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+
+def analyze_file(detector, path):
+    """Analyse one file and return its manifest record (runs in worker processes)"""
+    from .export import file_metadata
+
+    start = time.perf_counter()
+    timings = {}
+    try:
+        results = detector.detect_file(path, timings)
+        return {"path": path, "status": STATUS_OK, "results": results_to_dict(results),
+                "timings": timings, "metadata": file_metadata(path),
+                "elapsed": time.perf_counter() - start}
+    except Exception as e:
+        return {"path": path, "status": STATUS_ERROR, "error": str(e),
+                "error_type": type(e).__name__, "elapsed": time.perf_counter() - start}
+
+def _safe_fingerprint(path):
+    from .fingerprint import audio_fingerprint
+    try:
+        return audio_fingerprint(path)
+    except Exception:
+        return None  # Unreadable files fail in the analysis itself
+
+def _duplicate_record(path, fingerprint, original):
+    return {"path": path, "status": STATUS_OK, "results": original["results"],
+            "fingerprint": fingerprint, "duplicate_of": original["path"],
+            "saved_seconds": original.get("saved_seconds", original["elapsed"]),
+            "elapsed": 0.0}
+
+class BatchJob:
+    """
+    Resumable batch analysis of many files.
+
+    Completed files are recorded in the manifest as soon as they finish. When
+    the job is started again with the same manifest, completed files are
+    skipped and failed ones are retried until they have failed
+    `max_retries + 1` times in total.
+
+    With a claimer (see bpm_detector.sharding), a file is only processed if
+    the claimer grants it, so several nodes can share one file list.
+
+    With `dedup`, every file is fingerprinted from a few short decoded
+    windows first (see bpm_detector.fingerprint), in the worker pool when
+    there is one. Files whose audio was already
+    analysed, in this run or an earlier one, reuse that result instead of
+    running the full analysis.
+
+    With `memory_budget` (bytes), worker processes only start a file while
+    the estimated peaks of all running files fit in the budget; see
+    BPMDetector.estimate_file_peak.
+
+    With `metrics` (a MetricsRegistry), every record is counted and timed
+    there, along with the files still queued and dedup hits.
+    """
+
+    def __init__(self, files, manifest_path, detector=None, max_retries=2, workers=1,
+                 fsync=True, claimer=None, dedup=False, memory_budget=None, metrics=None):
+        if detector is None:
+            from .detector import BPMDetector
+            detector = BPMDetector()
+        self.files = list(dict.fromkeys(files))
+        self.detector = detector
+        self.max_retries = max_retries
+        self.workers = workers
+        self.manifest = Manifest(manifest_path, fsync=fsync)
+        self.claimer = claimer
+        self.skipped = set()  # Files claimed by other nodes
+        self.dedup = dedup
+        self.memory_budget = memory_budget
+        self.metrics = metrics
+
+    def _gave_up(self, path):
+        return path not in self.manifest.done and \
+            self.manifest.failures.get(path, 0) > self.max_retries
+
+    def pending(self) -> List[str]:
+        """Files that still need an attempt"""
+        return [path for path in self.files
+                if path not in self.manifest.done and not self._gave_up(path)
+                and path not in self.skipped]
+
+    def run(self, progress_callback=None) -> BatchProgress:
+        """
+        Process all pending files, retrying failures within this run as well.
+
+        Args:
+            progress_callback (callable): Called with (record, BatchProgress)
+                after each file
+
+        Returns:
+            BatchProgress: Final state of the job
+        """
+        completed = sum(1 for path in self.files if path in self.manifest.done)
+        failed = sum(1 for path in self.files if self._gave_up(path))
+        started = time.perf_counter()
+        processed = 0
+        deduplicated = 0
+        saved_seconds = 0.0
+
+        def progress():
+            elapsed = time.perf_counter() - started
+            total = len(self.files) - len(self.skipped)
+            remaining = total - completed - failed
+            rate = processed / elapsed if processed and elapsed > 0 else 0.0
+            return BatchProgress(total=total, completed=completed, failed=failed,
+                                 remaining=remaining, elapsed=elapsed, files_per_second=rate,
+                                 eta_seconds=remaining / rate if rate else None,
+                                 deduplicated=deduplicated, saved_seconds=saved_seconds)
+
+        if self.metrics is not None:
+            from .metrics import CACHE_REQUESTS, QUEUE_DEPTH, record_analysis
+
+            cache_requests = self.metrics.counter(CACHE_REQUESTS,
+                                                  "Cache lookups, by cache and result")
+            queue_depth = self.metrics.gauge(QUEUE_DEPTH, "Requests or files waiting for a worker")
+
+        def record_metrics(record):
+            if record is not None:
+                record_analysis(self.metrics, record)
+                if self.dedup:
+                    cache_requests.inc(cache="dedup",
+                                       result="hit" if "duplicate_of" in record else "miss")
+            queue_depth.set(progress().remaining)
+
+        try:
+            if self.metrics is not None:
+                record_metrics(None)
+            pending = self.pending()
+            while pending:
+                for record in self._process(pending):
+                    self.manifest.append(record)
+                    processed += 1
+                    if "duplicate_of" in record:
+                        deduplicated += 1
+                        saved_seconds += record["saved_seconds"]
+                    finished = record["status"] == STATUS_OK or self._gave_up(record["path"])
+                    if record["status"] == STATUS_OK:
+                        completed += 1
+                    elif finished:
+                        failed += 1
+                    if finished and self.claimer is not None:
+                        self.claimer.complete(record["path"])
+                    if self.metrics is not None:
+                        record_metrics(record)
+                    if progress_callback is not None:
+                        progress_callback(record, progress())
+                pending = self.pending()
+        finally:
+            self.manifest.close()
+        return progress()
+
+    def _claimed(self, paths):
+        for path in paths:
+            if self.claimer is None or self.claimer.claim(path):
+                yield path
+            else:
+                self.skipped.add(path)
+
+    def _process(self, paths):
+        # Claims are taken just before each file starts, so faster nodes
+        # end up with more of the work
+        paths = self._claimed(paths)
+        if self.workers <= 1:
+            yield from self._deduplicated(paths, None)
+            return
+        # Fingerprinting and analysis share one pool
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            yield from self._deduplicated(paths, executor)
+
+    def _deduplicated(self, paths, executor):
+        if not self.dedup:
+            yield from self._analyze(paths, executor)
+            return
+
+        reused = deque()  # Records of duplicates, ready to be reported
+        waiting = {}  # Fingerprint -> duplicates held until the first copy is done
+        fingerprints = {}  # Path -> fingerprint of files sent to analysis
+
+        def unique(paths):
+            for path, fingerprint in self._fingerprinted(paths, executor):
+                known = self.manifest.fingerprints.get(fingerprint)
+                if known is not None:
+                    reused.append(_duplicate_record(path, fingerprint,
+                                                    self.manifest.record_at(known)))
+                elif fingerprint in waiting:
+                    waiting[fingerprint].append(path)
+                else:
+                    if fingerprint is not None:
+                        waiting[fingerprint] = []
+                    fingerprints[path] = fingerprint
+                    yield path
+
+        for record in self._analyze(unique(paths), executor):
+            while reused:
+                yield reused.popleft()
+            fingerprint = fingerprints.pop(record["path"])
+            if fingerprint is not None:
+                record["fingerprint"] = fingerprint
+            yield record
+            duplicates = waiting.pop(fingerprint, [])
+            if record["status"] == STATUS_OK:
+                for path in duplicates:
+                    yield _duplicate_record(path, fingerprint, record)
+            # Otherwise the duplicates stay pending and the next pass retries them
+        while reused:
+            yield reused.popleft()
+
+    def _fingerprinted(self, paths, executor):
+        """(path, fingerprint) in order, computed a few files ahead in the pool"""
+        if executor is None:
+            for path in paths:
+                yield path, _safe_fingerprint(path)
+            return
+        ahead = deque()
+        for path in paths:
+            ahead.append((path, executor.submit(_safe_fingerprint, path)))
+            if len(ahead) >= self.workers * 2:
+                path, future = ahead.popleft()
+                yield path, future.result()
+        while ahead:
+            path, future = ahead.popleft()
+            yield path, future.result()
+
+    def _analyze(self, paths, executor):
+        if executor is None:
+            for path in paths:
+                yield analyze_file(self.detector, path)
+            return
+        # Keep a bounded number of files in flight so memory stays flat
+        paths = iter(paths)
+        running = {}  # Future -> reserved bytes
+        reserved = 0
+        path = None
+        while True:
+            while len(running) < self.workers * 2:
+                if path is None:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    peak = self._estimate_peak(path)
+                if running and self.memory_budget is not None and \
+                        reserved + peak > self.memory_budget:
+                    break  # Wait for running files to free memory
+                running[executor.submit(analyze_file, self.detector, path)] = peak
+                reserved += peak
+                path = None
+            if not running:
+                return
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                reserved -= running.pop(future)
+                yield future.result()
+
+    def _estimate_peak(self, path):
+        if self.memory_budget is None:
+            return 0
+        try:
+            return self.detector.estimate_file_peak(path)
+        except Exception:
+            return 0  # Unreadable; fails quickly in the worker
@@ -1,20 +1,167 @@
 #!/usr/bin/env python3
 import argparse
 import sys
-from .detector import BPMAlgorithm, analyze_bpm
+from .profiles import DEFAULT_PROFILE, PROFILES
+from .registry import BPMAlgorithm, algorithm_names
+
+def run_batch(args):
+    """Resumable batch run over files and directories, recorded in a manifest"""
+    from .batch import BatchJob, iter_audio_files, read_manifest
+    from .detector import BPMDetector
+    from .sharding import LockDirectoryClaimer, select_shard
+    from .store import EnvelopeStore
+
+    files = list(iter_audio_files(args.audio_file))
+    if args.shard:
+        index, count = (int(part) for part in args.shard.split('/'))
+        files = select_shard(files, index, count)
+    claimer = None
+    if args.claim_dir:
+        claimer = LockDirectoryClaimer(args.claim_dir, node_id=args.node_id,
+                                       stale_after=args.stale_after)
+
+    budget = int(args.memory_budget * 2**30) if args.memory_budget else None
+    # A file that would not fit next to the other workers on its own is
+    # decoded chunk by chunk
+    detector = BPMDetector(min_bpm=args.min_bpm, max_bpm=args.max_bpm, profile=args.profile,
+                           memory_budget=budget // max(args.workers, 1) if budget else None,
+                           store=EnvelopeStore(args.envelope_cache) if args.envelope_cache else None)
+    metrics, reporter = metrics_reporter(args)
+    job = BatchJob(files, args.manifest, detector, max_retries=args.max_retries,
+                   workers=args.workers, claimer=claimer, dedup=args.dedup,
+                   memory_budget=budget, metrics=metrics)
+
+    writer = None
+    if args.export:
+        from .export import open_writer
+        writer = open_writer(args.export)
+        # A resumed run rewrites the export, so it starts with the records of
+        # the earlier runs (the manifest was repaired when the job opened it)
+        for record in read_manifest(args.manifest):
+            writer.write(record)
+
+    def report(record, progress):
+        if writer is not None:
+            writer.write(record)
+        eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "?"
+        print(f"[{progress.completed + progress.failed}/{progress.total}] "
+              f"{record['status']}: {record['path']} "
+              f"({progress.files_per_second:.2f} files/s, ETA {eta})", file=sys.stderr)
+
+    try:
+        if reporter is not None:
+            reporter.start()
+        progress = job.run(report)
+    finally:
+        if reporter is not None:
+            reporter.stop()
+        if writer is not None:
+            writer.close()
+    print(f"Completed {progress.completed}/{progress.total} files, {progress.failed} failed")
+    if args.dedup:
+        print(f"Reused results for {progress.deduplicated} duplicate files, "
+              f"saving about {progress.saved_seconds:.1f}s of analysis")
+    return 0 if progress.failed == 0 else 1
+
+def metrics_reporter(args):
+    """(MetricsRegistry, MetricsReporter) for the --metrics-* options, or (None, None)"""
+    if not (args.metrics_file or args.metrics_json):
+        return None, None
+    from .metrics import MetricsRegistry, MetricsReporter
+
+    metrics = MetricsRegistry()
+    return metrics, MetricsReporter(metrics, args.metrics_file, args.metrics_json,
+                                    args.metrics_interval)
 
 def main():
     parser = argparse.ArgumentParser(description='Analyze BPM of an audio file')
-    parser.add_argument('audio_file', help='Path to the audio file')
-    parser.add_argument('--algorithm', 
-                      choices=[algo.value for algo in BPMAlgorithm],
-                      default=BPMAlgorithm.SOUNDTOUCH.value,
+    parser.add_argument('audio_file', nargs='*',
+                      help='Path to the audio file (several files or directories with --manifest)')
+    parser.add_argument('--algorithm',
+                      choices=algorithm_names(),
+                      default=BPMAlgorithm.AUTOCORRELATION.value,
                       help='BPM detection algorithm to use')
-    
+    parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                      help='Quality profile: draft is fastest, precise most exact')
+    parser.add_argument('--min-bpm', type=float, default=92, help='Minimum BPM')
+    parser.add_argument('--max-bpm', type=float, default=184, help='Maximum BPM')
+    parser.add_argument('--manifest',
+                      help='Batch mode: run all algorithms and append results to this '
+                           'JSONL file; rerunning resumes where it stopped')
+    parser.add_argument('--workers', type=int, default=1, help='Batch worker processes')
+    parser.add_argument('--max-retries', type=int, default=2,
+                      help='Batch retries per failing file')
+    parser.add_argument('--dedup', action='store_true',
+                      help='Batch mode: reuse results for files with identical audio')
+    parser.add_argument('--export', metavar='FILE',
+                      help='Batch mode: also stream flat result rows to FILE '
+                           '(.jsonl, .csv, or .parquet with pyarrow installed)')
+    parser.add_argument('--envelope-cache', metavar='DIR',
+                      help='Keep onset envelopes and other compact intermediates in DIR, '
+                           'so later runs (other BPM ranges, new algorithms) skip decoding')
+    parser.add_argument('--memory-budget', type=float, metavar='GB',
+                      help='Batch mode: only start files while their estimated peak '
+                           'memory fits in this many GB')
+    parser.add_argument('--shard', metavar='I/N',
+                      help='Batch mode: only process shard I of N (by path hash)')
+    parser.add_argument('--claim-dir',
+                      help='Batch mode: share work with other nodes through lock files '
+                           'in this directory')
+    parser.add_argument('--node-id', help='Stable node name for --claim-dir (default: host name)')
+    parser.add_argument('--stale-after', type=float,
+                      help='Seconds after which an unfinished claim of another node '
+                           'may be taken over')
+    parser.add_argument('--merge', metavar='OUTPUT',
+                      help='Merge the manifests given as arguments into OUTPUT')
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                      help='Run the local HTTP analysis service instead of analysing files')
+    parser.add_argument('--max-batch', type=int, default=8,
+                      help='Service: maximum requests coalesced into one worker batch')
+    parser.add_argument('--metrics-file', metavar='FILE',
+                      help='Batch and service: keep Prometheus text-format metrics in FILE '
+                           '(e.g. for the node_exporter textfile collector)')
+    parser.add_argument('--metrics-json', metavar='FILE',
+                      help='Batch and service: append a JSON metrics snapshot to FILE '
+                           'every --metrics-interval seconds')
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                      help='Seconds between metrics writes')
+
     args = parser.parse_args()
-    
+
+    if args.serve:
+        from .detector import BPMDetector
+        from .service import serve
+        host, _, port = args.serve.rpartition(':')
+        metrics, reporter = metrics_reporter(args)
+        if reporter is not None:
+            reporter.start()
+        try:
+            serve(host or '127.0.0.1', int(port),
+                  detector=BPMDetector(min_bpm=args.min_bpm, max_bpm=args.max_bpm,
+                                       profile=args.profile),
+                  workers=args.workers, max_batch=args.max_batch, metrics=metrics)
+        finally:
+            if reporter is not None:
+                reporter.stop()
+        return 0
+    if not args.audio_file:
+        parser.error('the following arguments are required: audio_file')
+    if args.merge:
+        from .sharding import merge_manifests
+        stats = merge_manifests(args.audio_file, args.merge)
+        print(f"Merged {stats['files']} files ({stats['ok']} ok, {stats['failed']} failed, "
+              f"{stats['duplicates']} duplicated)")
+        return 0
+    if args.manifest:
+        return run_batch(args)
+    if len(args.audio_file) > 1:
+        parser.error('analysing several files requires --manifest')
+
     try:
-        bpm = analyze_bpm(args.audio_file, BPMAlgorithm(args.algorithm))
+        # Imported only once there is work to do, so --help stays fast
+        from .detector import analyze_bpm
+        bpm = analyze_bpm(args.audio_file[0], args.algorithm,
+                          min_bpm=args.min_bpm, max_bpm=args.max_bpm, profile=args.profile)
         print(f"Detected BPM ({args.algorithm}): {bpm:.1f}")
         return 0
     except Exception as e:
@@ -22,4 +169,4 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main()) 
\ No newline at end of file
+    sys.exit(main())
@@ -1,60 +1,262 @@
-import soundfile as sf
+import asyncio
+import math
+import time
 import numpy as np
 from scipy import signal
 from enum import Enum
 from dataclasses import dataclass
-from typing import Dict
-from scipy import stats
+from typing import Dict, List, Optional
+from .memory import estimate_peak_bytes, mixdown, read_mono
+from .plan import get_analysis_plan
+from .profiles import DEFAULT_PROFILE, get_profile
+from .registry import BPMAlgorithm, available_algorithms, get_algorithm, schedule_algorithms
+from .features import (AudioFeatures, onset_strength, ONSET_ENVELOPE, SPECTRAL_FLUX,
+                       FRAME_ENERGIES)
 
-class BPMAlgorithm(Enum):
-    AUTOCORRELATION = "autocorrelation"
-    ENERGY_FLUX = "energy flux"
-    WEB_STYLE = "web style"
+# Key of the seconds spent decoding in the timings filled by detect_file
+DECODE_TIMING = "decode"
+
+class SamplingStrategy(Enum):
+    SKIP_EDGES = "skip edges"  # Evenly spaced segments, ignoring intro and outro
+    HIGH_ENERGY = "high energy"  # Loudest regions of the track
+
+@dataclass
+class BeatGrid:
+    """Constant-tempo beat grid: every beat is offset + i * 60 / bpm seconds"""
+    bpm: float
+    offset: float  # Seconds of the first beat
+    count: int  # Beats within the track
+    beats_per_bar: Optional[int] = None  # None when downbeats were not estimated
+    downbeat: Optional[int] = None  # Index of the first beat that starts a bar
+    score: float = 0.0  # Mean onset strength under the beats, comparable within a track
+
+    @property
+    def period(self):
+        """Seconds between beats"""
+        return 60.0 / self.bpm
+
+    @property
+    def beats(self):
+        """Beat times in seconds"""
+        return self.offset + np.arange(self.count) * self.period
+
+    @property
+    def downbeats(self):
+        """Times of the first beat of each bar, empty without downbeats"""
+        if self.beats_per_bar is None:
+            return np.empty(0)
+        return self.beats[self.downbeat::self.beats_per_bar]
 
 @dataclass
 class BPMResult:
     bpm: float
     confidence: float  # 0-1 scale
+    beat_grid: Optional[BeatGrid] = None  # Fitted at this result's tempo
 
 class BPMDetector:
-    def __init__(self, min_bpm=92, max_bpm=184):
+    def __init__(self, min_bpm=92, max_bpm=184, sampling=None, num_segments=4,
+                 segment_duration=20.0, edge_skip=0.1, fft_workers=1, memory_budget=None,
+                 profile=DEFAULT_PROFILE, store=None, beat_grid=True, beats_per_bar=4):
         self.min_bpm = min_bpm
         self.max_bpm = max_bpm
+        # Fit a beat grid to the detected tempos, from the onset envelope the
+        # algorithms already computed; beats_per_bar=None skips the downbeats
+        self.beat_grid = beat_grid
+        self.beats_per_bar = beats_per_bar
+        # Quality profile (name or QualityProfile): sample rate, front end,
+        # tempo grid and algorithms, see bpm_detector.profiles
+        self.profile = get_profile(profile)
+        # Optional EnvelopeStore: full-track intermediates are saved there and
+        # reused on later runs, so only the file hash has to be read again
+        self.store = store
+        # FFT threads per file; raise when running few long files rather
+        # than many files in parallel (-1 uses all cores)
+        self.fft_workers = fft_workers
+        # Excerpt sampling: None analyses the full track
+        self.sampling = sampling
+        self.num_segments = num_segments
+        self.segment_duration = segment_duration  # seconds
+        self.edge_skip = edge_skip  # fraction of the track skipped at each end
+        # Bytes one analysis may use; larger files are decoded chunk by chunk
+        # straight into mono. None always decodes in one piece
+        self.memory_budget = memory_budget
 
-    def detect_all(self, audio_data, sample_rate) -> Dict[BPMAlgorithm, BPMResult]:
+    def detect_file(self, file_path, timings=None) -> Dict[BPMAlgorithm, BPMResult]:
         """
-        Run all BPM detection algorithms and return their results.
-        
+        Run all BPM detection algorithms on an audio file.
+
+        When a sampling strategy is configured and the track is longer than
+        the requested segments, only those segments are decoded and analysed.
+        Tracks whose estimated footprint exceeds the memory budget are
+        decoded chunk by chunk, with identical results. With a store, the
+        audio is only decoded if a needed intermediate is not stored yet.
+
         Args:
-            audio_data (numpy.ndarray): Audio signal data
-            sample_rate (int): Sample rate of the audio
-            
+            file_path (str): Path to the audio file
+            timings (dict): Optional, filled with seconds spent per algorithm
+                name, and on decoding under DECODE_TIMING
+
         Returns:
             Dict[BPMAlgorithm, BPMResult]: Results from all algorithms
         """
+        import soundfile as sf
+
+        with sf.SoundFile(file_path) as f:
+            segment_frames = int(self.segment_duration * f.samplerate)
+            if self.sampling is None or f.frames <= self.num_segments * segment_frames:
+                if self.store is not None:
+                    return self._detect_stored(file_path, f, timings)
+                if self._needs_chunking(f.frames, f.channels):
+                    audio_data = _timed(timings, read_mono, f)
+                else:
+                    audio_data = _timed(timings, f.read)
+                return self.detect_all(audio_data, f.samplerate, timings)
+
+            starts = select_segments(f, self.sampling, self.num_segments,
+                                     segment_frames, self.edge_skip)
+            segment_results = []
+            for start in starts:
+                # Seek so that only the segment itself is decoded
+                f.seek(start)
+                audio_data = _timed(timings, f.read, segment_frames)
+                # Segment grids cannot be combined into one for the track
+                segment_results.append(self._detect_audio(audio_data, f.samplerate, timings,
+                                                          beat_grid=False))
+
+        return combine_segment_results(segment_results)
+
+    def _detect_stored(self, file_path, sound_file, timings):
+        from .store import content_hash
+
+        digest = content_hash(file_path)
+        sample_rate = self._analysis_rate(sound_file.samplerate)
+        plan = self.plan_for(sample_rate)
+        stored = self.store.load(digest, plan)
+
+        def decode():
+            sound_file.seek(0)
+            if self._needs_chunking(sound_file.frames, sound_file.channels):
+                audio_data = _timed(timings, read_mono, sound_file)
+            else:
+                audio_data = _timed(timings, sound_file.read)
+            return self._prepare(audio_data, sound_file.samplerate)[0]
+
+        features = AudioFeatures(None, sample_rate, plan, self.fft_workers, loader=decode,
+                                 intermediates=stored)
+        results = self.detect_features(features, timings)
+        computed = features.computed()
+        if any(name not in stored for name in computed):
+            self.store.save(digest, plan, computed)
+        return results
+
+    def _needs_chunking(self, frames, channels):
+        return self.memory_budget is not None and \
+            self._estimate_peak(frames, channels) > self.memory_budget
+
+    def _estimate_peak(self, frames, channels, chunked=False):
+        profile = self.profile
+        return estimate_peak_bytes(frames, channels, profile.hop_length, profile.n_fft,
+                                   profile.n_bands, chunked=chunked)
+
+    def plan_for(self, sample_rate):
+        """Analysis plan of this detector's profile and tempo range"""
+        return get_analysis_plan(sample_rate, min_bpm=self.min_bpm, max_bpm=self.max_bpm,
+                                 **self.profile.plan_options())
+
+    def _analysis_rate(self, sample_rate):
+        target = self.profile.sample_rate
+        return sample_rate if target is None or sample_rate <= target else target
+
+    def _prepare(self, audio_data, sample_rate):
+        """Validated mono audio at the profile's analysis rate"""
         if len(audio_data) == 0:
             raise ValueError("Empty audio data")
         if sample_rate <= 0:
             raise ValueError("Invalid sample rate")
-            
+
         # Convert to mono if stereo
         if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
+            audio_data = mixdown(audio_data)
+
+        target = self._analysis_rate(sample_rate)
+        if target != sample_rate:
+            divisor = math.gcd(int(sample_rate), target)
+            audio_data = signal.resample_poly(audio_data, target // divisor,
+                                              int(sample_rate) // divisor)
+        return audio_data, target
+
+    def estimate_file_peak(self, file_path) -> int:
+        """Estimated peak memory in bytes of detect_file on this file"""
+        import soundfile as sf
+
+        info = sf.info(file_path)
+        frames = info.frames
+        segment_frames = int(self.segment_duration * info.samplerate)
+        # Same branch as detect_file: short tracks are analysed whole
+        if self.sampling is not None and frames > self.num_segments * segment_frames:
+            frames = segment_frames
+        return self._estimate_peak(frames, info.channels,
+                                   chunked=self._needs_chunking(frames, info.channels))
+
+    def detect_all(self, audio_data, sample_rate, timings=None) -> Dict[BPMAlgorithm, BPMResult]:
+        """
+        Run all BPM detection algorithms and return their results.
+        
+        Args:
+            audio_data (numpy.ndarray): Audio signal data
+            sample_rate (int): Sample rate of the audio
+            timings (dict): Optional, filled with seconds spent per algorithm name
+            
+        Returns:
+            Dict[BPMAlgorithm, BPMResult]: Results from all algorithms
+        """
+        return self._detect_audio(audio_data, sample_rate, timings)
+
+    def _detect_audio(self, audio_data, sample_rate, timings=None, beat_grid=True):
+        audio_data, sample_rate = self._prepare(audio_data, sample_rate)
+        plan = self.plan_for(sample_rate)
+        return self._run_algorithms(AudioFeatures(audio_data, sample_rate, plan, self.fft_workers),
+                                    available_algorithms(self.profile.algorithms), timings,
+                                    beat_grid)
+
+    def detect_features(self, features, timings=None) -> Dict[BPMAlgorithm, BPMResult]:
+        """
+        Run all registered algorithms on precomputed or lazily computed
+        intermediates. Shared intermediates are computed once, and algorithms
+        run in order of increasing cost.
         
-        # Run all algorithms
+        Args:
+            features (AudioFeatures): Audio and its intermediates
+            timings (dict): Optional, seconds per algorithm name are added to
+                it; an intermediate counts towards the first algorithm using it
+            
+        Returns:
+            Dict[BPMAlgorithm, BPMResult]: Results keyed by algorithm key
+        """
+        return self._run_algorithms(features, available_algorithms(self.profile.algorithms),
+                                    timings)
+
+    def _run_algorithms(self, features, specs, timings=None, beat_grid=True):
         results = {}
         valid_bpms = []
         
         # First pass: collect all BPM values
-        for algo in BPMAlgorithm:
-            bpm = self.detect(audio_data, sample_rate, algo)
+        for spec in schedule_algorithms(specs):
+            start = time.perf_counter()
+            decoded = timings.get(DECODE_TIMING, 0.0) if timings is not None else 0.0
+            bpm = get_algorithm(spec.key)(features, self.min_bpm, self.max_bpm)
+            if timings is not None:
+                # Audio decoded lazily on behalf of this algorithm is not its time
+                decoded = timings.get(DECODE_TIMING, 0.0) - decoded
+                timings[spec.name] = timings.get(spec.name, 0.0) + \
+                    time.perf_counter() - start - decoded
             if bpm > 0:  # Only consider valid BPM values
                 valid_bpms.append(bpm)
-            results[algo] = BPMResult(bpm=bpm, confidence=0.0)  # Initial confidence
+            results[spec.key] = BPMResult(bpm=bpm, confidence=0.0)  # Initial confidence
         
         # Calculate confidence by comparing with other algorithms
         if len(valid_bpms) >= 2:  # Need at least 2 valid results
-            for algo in BPMAlgorithm:
+            for algo in results:
                 if results[algo].bpm <= 0:  # Skip invalid results
                     continue
                 
@@ -81,92 +283,442 @@ class BPMDetector:
                 confidence = int_factor * 0.6 + agreement_factor * 0.4
                 
                 results[algo] = BPMResult(bpm=this_bpm, confidence=confidence)
-        
+
+        if beat_grid and self.beat_grid:
+            self._attach_beat_grids(features, results)
         return results
 
+    def _attach_beat_grids(self, features, results):
+        """Fit a grid at each valid result's tempo and attach it to that result"""
+        grids = {}  # Algorithms agreeing on a tempo share its grid
+        for key, result in results.items():
+            if result.bpm <= 0:
+                continue
+            if result.bpm not in grids:
+                grids[result.bpm] = estimate_beat_grid(features, result.bpm, self.beats_per_bar)
+            results[key] = BPMResult(result.bpm, result.confidence, grids[result.bpm])
+
+    def detect_file_progressive(self, file_path, first_seconds=10.0, chunk_seconds=1.0,
+                                timings=None):
+        """
+        Analyse a file while decoding it, yielding refined results as it goes.
+
+        The first update covers the first `first_seconds` of audio, each
+        further update twice as much, and the last one the whole track with
+        the same results as detect_file. The STFT, flux and energy frames
+        are computed once, chunk by chunk, and shared by all updates; an
+        update only reruns the envelope post-processing and the estimators.
+        Provisional updates use the algorithms marked as streaming.
+
+        Sampled and stored analyses have no partial stage and yield their
+        detect_file results once.
+
+        Args:
+            file_path (str): Path to the audio file
+            first_seconds (float): Audio behind the first provisional update
+            chunk_seconds (float): Audio decoded per read
+            timings (dict): Optional, filled like in detect_file for the final
+                update. The incremental frames count towards the first
+                algorithm of the schedule
+
+        Yields:
+            Tuple[float, Dict[BPMAlgorithm, BPMResult], bool]: Seconds of
+            audio analysed, results, and whether they are final
+        """
+        import soundfile as sf
+        from .progressive import ProgressiveAnalysis, StreamResampler
+
+        with sf.SoundFile(file_path) as f:
+            duration = f.frames / f.samplerate
+            segment_frames = int(self.segment_duration * f.samplerate)
+            if self.store is not None or (self.sampling is not None and
+                                          f.frames > self.num_segments * segment_frames):
+                yield duration, self.detect_file(file_path, timings), True
+                return
+            if f.frames == 0:
+                raise ValueError("Empty audio data")
+
+            sample_rate = self._analysis_rate(f.samplerate)
+            resampler = None
+            if sample_rate != f.samplerate:
+                resampler = StreamResampler(f.samplerate, sample_rate)
+            specs = available_algorithms(self.profile.algorithms)
+            streaming = [spec for spec in specs if spec.streaming]
+            analysis = ProgressiveAnalysis(sample_rate, self.plan_for(sample_rate),
+                                           self.fft_workers,
+                                           keep_audio=len(streaming) < len(specs))
+
+            next_update = first_seconds
+            frame_seconds = 0.0  # Spent on the incremental frames
+            blocks = f.blocks(max(1, int(chunk_seconds * f.samplerate)), always_2d=True)
+            while True:
+                block = _timed(timings, next, blocks, None)
+                if block is None:
+                    break
+                start = time.perf_counter()
+                mono = mixdown(block)
+                analysis.push(mono if resampler is None else resampler.push(mono))
+                frame_seconds += time.perf_counter() - start
+                if analysis.seconds >= next_update and analysis.ready() and \
+                        analysis.received < f.frames * sample_rate / f.samplerate:
+                    yield analysis.seconds, \
+                        self._run_algorithms(analysis.snapshot(), streaming), False
+                    next_update = analysis.seconds * 2
+            start = time.perf_counter()
+            if resampler is not None:
+                analysis.push(resampler.push(np.zeros(0), final=True))
+
+        analysis.finish()
+        features = analysis.snapshot()
+        frame_seconds += time.perf_counter() - start
+        results = self._run_algorithms(features, specs, timings)
+        if timings is not None:
+            first = schedule_algorithms(specs)[0].name
+            timings[first] = timings.get(first, 0.0) + frame_seconds
+        yield analysis.seconds, results, True
+
     def detect(self, audio_data, sample_rate, algorithm=BPMAlgorithm.AUTOCORRELATION):
         """Single algorithm detection method"""
-        if algorithm == BPMAlgorithm.AUTOCORRELATION:
-            return analyze_bpm_autocorrelation(audio_data, sample_rate, self.min_bpm, self.max_bpm)
-        elif algorithm == BPMAlgorithm.ENERGY_FLUX:
-            return analyze_bpm_energy_flux(audio_data, sample_rate, self.min_bpm, self.max_bpm)
-        elif algorithm == BPMAlgorithm.WEB_STYLE:
-            return analyze_bpm_web_style(audio_data, sample_rate, self.min_bpm, self.max_bpm)
+        estimate = get_algorithm(algorithm)
+        if sample_rate != self._analysis_rate(sample_rate):
+            audio_data, sample_rate = self._prepare(audio_data, sample_rate)
+        plan = self.plan_for(sample_rate)
+        features = AudioFeatures(audio_data, sample_rate, plan, self.fft_workers)
+        return estimate(features, self.min_bpm, self.max_bpm)
+
+    async def detect_all_async(self, file_path, executor=None) -> Dict[BPMAlgorithm, BPMResult]:
+        """
+        Awaitable detect_file that keeps the event loop free.
+
+        Decoding and analysis run in `executor` (the loop's default thread
+        pool if None; a ProcessPoolExecutor avoids contention on the GIL).
+        Cancelling the await cancels the job if it has not started yet.
+
+        Args:
+            file_path (str): Path to the audio file
+            executor (concurrent.futures.Executor): Where the work runs
+
+        Returns:
+            Dict[BPMAlgorithm, BPMResult]: Results from all algorithms
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.detect_file, file_path)
+
+    async def detect_files_async(self, file_paths, executor=None, max_concurrency=4):
+        """
+        Analyse many files, yielding (path, results) as each one finishes.
+
+        At most `max_concurrency` files are in flight; paths are consumed
+        lazily, so the input may be a long or endless iterable. A file that
+        fails yields its exception in place of the results. Leaving the loop
+        early (break, or cancelling the consuming task) cancels queued work.
+
+        Args:
+            file_paths (Iterable[str]): Audio files
+            executor (concurrent.futures.Executor): Where the work runs
+            max_concurrency (int): Files analysed at the same time
+        """
+        async def run(path):
+            try:
+                return path, await self.detect_all_async(path, executor)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return path, e
+
+        file_paths = iter(file_paths)
+        running = set()
+        try:
+            while True:
+                for path in file_paths:
+                    running.add(asyncio.ensure_future(run(path)))
+                    if len(running) >= max_concurrency:
+                        break
+                if not running:
+                    return
+                finished, running = await asyncio.wait(running,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
+
+def _timed(timings, read, *args):
+    """read(*args), adding its duration to timings[DECODE_TIMING]"""
+    start = time.perf_counter()
+    audio_data = read(*args)
+    if timings is not None:
+        timings[DECODE_TIMING] = timings.get(DECODE_TIMING, 0.0) + time.perf_counter() - start
+    return audio_data
+
+def analyze_bpm(file_path, algorithm=BPMAlgorithm.AUTOCORRELATION, min_bpm=92, max_bpm=184,
+                profile=DEFAULT_PROFILE):
+    """
+    Detect the BPM of an audio file with a single algorithm.
+
+    Args:
+        file_path (str): Path to the audio file
+        algorithm (BPMAlgorithm): Algorithm to use
+        min_bpm (float): Lower bound of the tempo range
+        max_bpm (float): Upper bound of the tempo range
+        profile (str): Quality profile, see bpm_detector.profiles
+
+    Returns:
+        float: Detected BPM, 0 if none was found
+    """
+    import soundfile as sf
+
+    audio_data, sample_rate = sf.read(file_path)
+    if len(audio_data.shape) > 1:
+        audio_data = np.mean(audio_data, axis=1)
+    detector = BPMDetector(min_bpm=min_bpm, max_bpm=max_bpm, profile=profile)
+    return detector.detect(audio_data, sample_rate, algorithm)
+
+def select_segments(sound_file, strategy, num_segments, segment_frames, edge_skip=0.1,
+                    probe_duration=1.0) -> List[int]:
+    """
+    Pick the start frames of the segments to analyse.
+
+    Args:
+        sound_file (soundfile.SoundFile): Open, seekable audio file
+        strategy (SamplingStrategy): How to choose the segments
+        num_segments (int): Number of segments to pick
+        segment_frames (int): Length of each segment in frames
+        edge_skip (float): Fraction of the track to ignore at each end
+        probe_duration (float): Length in seconds of the energy probes
+            used by SamplingStrategy.HIGH_ENERGY
+
+    Returns:
+        List[int]: Sorted, non-overlapping segment start frames; fewer than
+        `num_segments` when the track is too short for that many
+    """
+    total = sound_file.frames
+    first = int(total * edge_skip)
+    last = int(total * (1 - edge_skip)) - segment_frames
+    if last < first:
+        # Track too short to skip the edges, fall back to the whole range
+        first, last = 0, max(0, total - segment_frames)
+
+    if strategy == SamplingStrategy.SKIP_EDGES:
+        # Fewer segments when that many would overlap in the usable range
+        count = min(num_segments, (last - first) // segment_frames + 1)
+        starts = np.linspace(first, last, count).astype(int)
+        return sorted(set(starts.tolist()))
+
+    if strategy != SamplingStrategy.HIGH_ENERGY:
+        raise ValueError(f"Unknown sampling strategy: {strategy}")
+
+    # Probe short windows at evenly spaced candidates, decoding only the probes
+    probe_frames = min(segment_frames, int(probe_duration * sound_file.samplerate))
+    candidates = np.linspace(first, last, num_segments * 4).astype(int)
+    energies = []
+    for start in candidates:
+        sound_file.seek(start + (segment_frames - probe_frames) // 2)
+        probe = sound_file.read(probe_frames)
+        energies.append(np.mean(probe ** 2) if len(probe) else 0.0)
+
+    # Greedily keep the loudest candidates that do not overlap
+    starts = []
+    for idx in np.argsort(energies)[::-1]:
+        start = int(candidates[idx])
+        if all(abs(start - other) >= segment_frames for other in starts):
+            starts.append(start)
+        if len(starts) == num_segments:
+            break
+    return sorted(starts)
+
+def combine_segment_results(segment_results, tolerance=1.0) -> Dict[BPMAlgorithm, BPMResult]:
+    """
+    Combine per-segment results into one result per algorithm.
+
+    The largest group of segments agreeing within `tolerance` BPM wins, and
+    the confidence is the mean confidence of that group scaled by the
+    fraction of segments in it.
+
+    Args:
+        segment_results (List[Dict[BPMAlgorithm, BPMResult]]): Results per segment
+        tolerance (float): Maximum BPM difference for two segments to agree
+
+    Returns:
+        Dict[BPMAlgorithm, BPMResult]: Combined results
+    """
+    combined = {}
+    keys = list(dict.fromkeys(key for r in segment_results for key in r))
+    for algo in keys:
+        valid = [r[algo] for r in segment_results if algo in r and r[algo].bpm > 0]
+        if not valid:
+            combined[algo] = BPMResult(bpm=0, confidence=0.0)
+            continue
+
+        best_group = None
+        for candidate in valid:
+            group = [r for r in valid if abs(r.bpm - candidate.bpm) <= tolerance]
+            if (best_group is None or len(group) > len(best_group) or
+                    (len(group) == len(best_group) and
+                     np.mean([r.confidence for r in group]) >
+                     np.mean([r.confidence for r in best_group]))):
+                best_group = group
+
+        agreement = len(best_group) / len(segment_results)
+        bpm = float(np.median([r.bpm for r in best_group]))
+        confidence = float(np.mean([r.confidence for r in best_group])) * agreement
+        combined[algo] = BPMResult(bpm=bpm, confidence=confidence)
+    return combined
+
+def compare_results(estimate, reference) -> Dict[BPMAlgorithm, float]:
+    """
+    Absolute BPM error of each algorithm's estimate against a reference,
+    e.g. sampled results against the full-track results.
+    NaN marks algorithms without a valid result on either side.
+    """
+    errors = {}
+    for algo, ref in reference.items():
+        est = estimate.get(algo)
+        if est is None or est.bpm <= 0 or ref.bpm <= 0:
+            errors[algo] = float('nan')
         else:
-            raise ValueError(f"Unknown algorithm: {algorithm}")
+            errors[algo] = abs(est.bpm - ref.bpm)
+    return errors
 
-def analyze_bpm_autocorrelation(audio_data, sample_rate, min_bpm=92, max_bpm=184):
+def analyze_bpm_autocorrelation(audio_data, sample_rate, min_bpm=92, max_bpm=184, plan=None,
+                                workers=1):
     """BPM detection using autocorrelation method"""
-    # Convert to mono and normalize
-    audio_data = audio_data / np.max(np.abs(audio_data))
-    
-    # Parameters
-    hop_length = 512
-    win_length = 2048
-    
-    # Compute onset envelope
-    onset_env = onset_strength(audio_data, sample_rate, hop_length=hop_length)
-    
-    # Convert to lag values
-    min_lag = int(60.0 * sample_rate / (hop_length * max_bpm))
-    max_lag = int(60.0 * sample_rate / (hop_length * min_bpm))
-    
-    # Compute autocorrelation
-    ac = signal.correlate(onset_env, onset_env, mode='full')
-    ac = ac[len(ac)//2:]  # Keep only positive lags
-    
-    # Restrict to tempo range
-    ac = ac[min_lag:max_lag]
-    
-    # Find peaks in autocorrelation
-    peaks = signal.find_peaks(ac, distance=min_lag)[0]
+    plan = plan or get_analysis_plan(sample_rate, min_bpm=min_bpm, max_bpm=max_bpm)
+    return estimate_autocorrelation(AudioFeatures(audio_data, sample_rate, plan, workers),
+                                    min_bpm, max_bpm)
+
+def analyze_bpm_energy_flux(audio_data, sample_rate, min_bpm=92, max_bpm=184, plan=None,
+                            workers=1):
+    """BPM detection using energy flux method"""
+    plan = plan or get_analysis_plan(sample_rate, min_bpm=min_bpm, max_bpm=max_bpm)
+    return estimate_energy_flux(AudioFeatures(audio_data, sample_rate, plan, workers),
+                                min_bpm, max_bpm)
+
+def analyze_bpm_web_style(audio_data, sample_rate, min_bpm=92, max_bpm=184, plan=None,
+                          workers=1):
+    """BPM detection using an approach similar to web-audio-beat-detector"""
+    plan = plan or get_analysis_plan(sample_rate, min_bpm=min_bpm, max_bpm=max_bpm)
+    return estimate_web_style(AudioFeatures(audio_data, sample_rate, plan, workers),
+                              min_bpm, max_bpm)
+
+# Coarse search evaluates at most this many lags; wider ranges are searched
+# on a decimated envelope first
+COARSE_LAGS = 32
+# Beat multiples used to refine the period, and the longest lag in seconds
+REFINE_MULTIPLES = 8
+REFINE_MAX_SECONDS = 6.0
+
+def lag_autocorrelation(onset_env, lags):
+    """Autocorrelation of the envelope at the given positive integer lags only"""
+    return np.array([np.dot(onset_env[:-lag], onset_env[lag:]) for lag in lags])
+
+def _parabolic_peak(y_left, y_peak, y_right):
+    """Offset in (-0.5, 0.5) of the vertex of a parabola through three points"""
+    denominator = y_left - 2 * y_peak + y_right
+    if denominator >= 0:
+        return 0.0  # Not a maximum
+    return float(np.clip(0.5 * (y_left - y_right) / denominator, -0.5, 0.5))
+
+def _coarse_lag(onset_env, min_lag, max_lag):
+    """Best integer lag in [min_lag, max_lag), or None"""
+    factor = max(1, -(-(max_lag - min_lag) // COARSE_LAGS))
+    if factor > 1:
+        # Average groups of frames so the lag range shrinks by `factor`
+        usable = len(onset_env) // factor * factor
+        coarse_env = onset_env[:usable].reshape(-1, factor).mean(axis=1)
+        lags = np.arange(min_lag // factor, -(-max_lag // factor))
+    else:
+        coarse_env = onset_env
+        lags = np.arange(min_lag, max_lag)
+    lags = lags[(lags > 0) & (lags < len(coarse_env))]
+    if len(lags) == 0:
+        return None
+
+    ac = lag_autocorrelation(coarse_env, lags)
+    peaks = signal.find_peaks(ac, distance=max(1, min_lag // factor))[0]
     if len(peaks) == 0:
+        return None
+    best = lags[peaks[np.argmax(ac[peaks])]] * factor
+    if factor == 1:
+        return int(best)
+    # Back to full resolution around the coarse winner
+    lags = np.arange(max(min_lag, best - factor), min(max_lag, best + factor + 1))
+    return int(lags[np.argmax(lag_autocorrelation(onset_env, lags))])
+
+def refine_lag(onset_env, lag, max_lag):
+    """
+    Fractional beat period around an integer autocorrelation peak.
+
+    The peak is interpolated with a parabola, then the peaks at multiples of
+    the period (2T, 3T, ...) are located and interpolated the same way. A
+    least-squares fit through them divides the remaining interpolation
+    error by the multiple, so precision grows without a smaller hop.
+    """
+    n = len(onset_env)
+
+    def unbiased(lags):
+        return lag_autocorrelation(onset_env, lags) / (n - np.asarray(lags))
+
+    if lag < 1 or lag + 1 >= n:
+        return float(lag)
+    left, peak, right = unbiased([lag - 1, lag, lag + 1])
+    period = lag + _parabolic_peak(left, peak, right)
+
+    multiples, positions = [1], [period]
+    for k in range(2, REFINE_MULTIPLES + 1):
+        center = int(round(k * period))
+        if center + 2 > min(max_lag, n // 2):
+            break
+        lags = np.arange(center - 2, center + 3)
+        ac = unbiased(lags)
+        i = int(np.argmax(ac))
+        if i in (0, len(lags) - 1) or abs(lags[i] - k * period) > 1:
+            break  # Periodicity does not hold this far; keep what we have
+        positions.append(lags[i] + _parabolic_peak(*ac[i - 1:i + 2]))
+        multiples.append(k)
+        period = np.dot(multiples, positions) / np.dot(multiples, multiples)
+    return float(period)
+
+def estimate_autocorrelation(features, min_bpm=92, max_bpm=184):
+    """
+    Autocorrelation tempo estimate from the onset envelope.
+
+    A coarse search over integer lags in the tempo range picks the beat
+    period, which refine_lag then resolves to a fraction of a frame.
+    """
+    plan = features.plan_for(min_bpm, max_bpm)
+    sample_rate = features.sample_rate
+    hop_length = plan.hop_length
+
+    onset_env = features.get(ONSET_ENVELOPE)
+
+    lag = _coarse_lag(onset_env, plan.min_lag, plan.max_lag)
+    if lag is None:
         return 0
-    
-    # Convert peak positions to BPM
-    lag_peaks = peaks + min_lag
-    bpms = 60.0 * sample_rate / (hop_length * lag_peaks)
-    
-    # Weight by peak height
-    peak_heights = ac[peaks]
-    if len(peak_heights) > 0:
-        best_peak = peaks[np.argmax(peak_heights)]
-        bpm = 60.0 * sample_rate / (hop_length * (best_peak + min_lag))
-        if min_bpm <= bpm <= max_bpm:
-            return float(bpm)
-    
+    max_refine_lag = int(REFINE_MAX_SECONDS * sample_rate / hop_length)
+    period = refine_lag(onset_env, lag, max_refine_lag)
+    bpm = 60.0 * sample_rate / (hop_length * period)
+    if min_bpm <= bpm <= max_bpm:
+        return float(bpm)
     return 0
 
-def analyze_bpm_energy_flux(audio_data, sample_rate, min_bpm=92, max_bpm=184):
-    """BPM detection using energy flux method"""
-    # Parameters
-    frame_size = 1024
-    hop_size = 512
-    n_fft = 2048  # Fixed FFT size
+def estimate_energy_flux(features, min_bpm=92, max_bpm=184):
+    """Energy flux tempo estimate from the spectral flux curve"""
+    plan = features.plan_for(min_bpm, max_bpm)
+    hop_size = plan.hop_length
     
-    # Compute energy flux
-    flux = np.zeros(len(audio_data) // hop_size - 1)
-    for i in range(len(flux)):
-        frame1 = audio_data[i * hop_size:i * hop_size + frame_size]
-        frame2 = audio_data[(i + 1) * hop_size:(i + 1) * hop_size + frame_size]
-        
-        # Zero-pad frames to n_fft
-        frame1 = np.pad(frame1, (0, n_fft - len(frame1)))
-        frame2 = np.pad(frame2, (0, n_fft - len(frame2)))
-        
-        # Compute spectral flux
-        spec1 = np.abs(np.fft.rfft(frame1))
-        spec2 = np.abs(np.fft.rfft(frame2))
-        flux[i] = np.sum(np.maximum(0, spec2 - spec1))
+    # Energy flux between consecutive frames zero-padded to n_fft
+    flux = features.get(SPECTRAL_FLUX)
     
     # Find peaks in energy flux
-    peaks = signal.find_peaks(flux, distance=int(0.3 * sample_rate / hop_size))[0]
+    peaks = signal.find_peaks(flux, distance=plan.flux_peak_distance)[0]
     
     if len(peaks) < 2:
         return 0
     
     # Calculate average time between peaks
-    peak_times = peaks * hop_size / sample_rate
+    peak_times = peaks * hop_size / features.sample_rate
     intervals = np.diff(peak_times)
     avg_interval = np.median(intervals)
     
@@ -179,26 +731,15 @@ def analyze_bpm_energy_flux(audio_data, sample_rate, min_bpm=92, max_bpm=184):
         
     return 0
 
-def analyze_bpm_web_style(audio_data, sample_rate, min_bpm=92, max_bpm=184):
-    """BPM detection using an approach similar to web-audio-beat-detector"""
-    # Convert to mono and normalize
-    audio_data = audio_data / np.max(np.abs(audio_data))
-    
-    # Parameters
-    frame_size = 2048
-    hop_size = 512
-    
-    # Split audio into frames
-    num_frames = (len(audio_data) - frame_size) // hop_size + 1
-    frames = np.array([audio_data[i * hop_size:i * hop_size + frame_size] 
-                      for i in range(num_frames)])
-    
-    # Apply Hanning window
-    window = np.hanning(frame_size)
-    frames = frames * window
+def estimate_web_style(features, min_bpm=92, max_bpm=184):
+    """Web style tempo estimate from windowed frame energies"""
+    from scipy import stats  # Only this algorithm needs scipy.stats
+
+    plan = features.plan_for(min_bpm, max_bpm)
+    hop_size = plan.hop_length
     
-    # Calculate energy for each frame
-    energies = np.sum(frames ** 2, axis=1)
+    # Hann-windowed energy of each frame of the normalized audio
+    energies = features.get(FRAME_ENERGIES)
     
     # Calculate energy flux (difference between consecutive frames)
     energy_flux = np.diff(energies)
@@ -210,13 +751,13 @@ def analyze_bpm_web_style(audio_data, sample_rate, min_bpm=92, max_bpm=184):
     # Find peaks (beat candidates)
     # Use dynamic thresholding
     threshold = np.mean(energy_flux) + 0.1 * np.std(energy_flux)
-    peaks = signal.find_peaks(energy_flux, height=threshold, distance=int(0.35 * sample_rate / hop_size))[0]
+    peaks = signal.find_peaks(energy_flux, height=threshold, distance=plan.web_peak_distance)[0]
     
     if len(peaks) < 2:
         return 0
     
     # Convert peaks to time domain
-    peak_times = peaks * hop_size / sample_rate
+    peak_times = peaks * hop_size / features.sample_rate
     
     # Calculate intervals between peaks
     intervals = np.diff(peak_times)
@@ -232,7 +773,7 @@ def analyze_bpm_web_style(audio_data, sample_rate, min_bpm=92, max_bpm=184):
     
     # Use kernel density estimation to find the most common BPM
     kde = stats.gaussian_kde(valid_bpms)
-    bpm_range = np.linspace(min_bpm, max_bpm, 200)
+    bpm_range = plan.kde_grid
     bpm_probs = kde(bpm_range)
     
     # Get the BPM with highest probability
@@ -240,38 +781,85 @@ def analyze_bpm_web_style(audio_data, sample_rate, min_bpm=92, max_bpm=184):
     
     return float(best_bpm)
 
-def onset_strength(y, sr, hop_length=512):
-    """Compute onset strength envelope with improved parameters"""
-    # Parameters
-    n_fft = 2048
-    
-    # Compute spectrogram with mel scaling
-    freqs = np.linspace(0, sr/2, n_fft//2 + 1)
-    mel_f = 2595 * np.log10(1 + freqs/700)
-    mel_weights = np.exp(-0.5 * ((mel_f[:, np.newaxis] - mel_f) / (mel_f[1] - mel_f[0])) ** 2)
-    mel_weights = mel_weights / mel_weights.sum(axis=1, keepdims=True)
-    
-    # Compute STFT
-    D = np.abs(signal.stft(y, nperseg=n_fft, noverlap=n_fft-hop_length)[2])
-    
-    # Apply mel weighting
-    D = np.dot(mel_weights, D)
-    
-    # Convert to log-magnitude
-    D = np.log1p(D)
-    
-    # Compute first-order difference
-    onset_env = np.diff(D, axis=1)
-    onset_env = np.maximum(0, onset_env)
-    
-    # Apply high-pass filter to remove DC
-    b, a = signal.butter(2, 0.1, btype='high', fs=sr/hop_length)
-    onset_env = signal.filtfilt(b, a, onset_env, axis=1)
-    
-    # Normalize
-    onset_env = onset_env - onset_env.mean(axis=1, keepdims=True)
-    onset_env = onset_env / onset_env.std(axis=1, keepdims=True)
-    onset_env = np.mean(onset_env, axis=0)
-    onset_env = onset_env / np.max(np.abs(onset_env))
-    
-    return onset_env
\ No newline at end of file
+def _sample(onset_env, positions):
+    """Envelope linearly interpolated at fractional frame positions"""
+    return np.interp(positions, np.arange(len(onset_env)), onset_env)
+
+def _align_comb(onset_env, period):
+    """
+    (phase, score) of the comb with teeth `period` frames apart that best
+    matches the envelope, or None if the envelope is shorter than two teeth.
+
+    The comb is slid over one period of phases and scored by the mean
+    envelope under its teeth; each phase reads about N / period frames, so
+    the search is linear in the length of the envelope.
+    """
+    n_phases = int(math.ceil(period))
+    n_teeth = int((len(onset_env) - n_phases) / period) + 1
+    if n_teeth < 2:
+        return None
+    positions = np.arange(n_phases)[:, None] + np.arange(n_teeth) * period
+    scores = _sample(onset_env, positions).mean(axis=1)
+    best = int(np.argmax(scores))
+    # Phases wrap around after one period
+    phase = best + _parabolic_peak(scores[best - 1], scores[best],
+                                   scores[(best + 1) % n_phases])
+    return phase % period, float(scores[best])
+
+def estimate_beat_grid(features, bpm, beats_per_bar=4) -> Optional[BeatGrid]:
+    """
+    Beat grid at the given tempo, aligned to the onset envelope.
+
+    The comb is aligned with _align_comb, and its score is kept on the grid:
+    a tempo that is slightly off drifts against the beats and scores lower,
+    so best_beat_grid can pick the best fitting of several tempos. Downbeats
+    go to the position in the bar whose beats carry the strongest onsets on
+    average.
+
+    Args:
+        features (AudioFeatures): Audio and its intermediates
+        bpm (float): Tempo of the grid, e.g. an algorithm's result
+        beats_per_bar (int): Beats per bar, or None to skip downbeats
+
+    Returns:
+        Optional[BeatGrid]: None if the tempo does not span two beats of the track
+    """
+    onset_env = features.get(ONSET_ENVELOPE)
+    hop_length = features.plan.hop_length
+    seconds_per_frame = hop_length / features.sample_rate
+
+    period = 60.0 / (bpm * seconds_per_frame)  # In envelope frames
+    aligned = _align_comb(onset_env, period)
+    if aligned is None:
+        return None
+    phase, score = aligned
+
+    # Envelope frame i is the change into STFT frame i + 1, which is centred
+    # on sample (i + 1) * hop_length
+    offset = (phase + 1) * seconds_per_frame
+    duration = (len(onset_env) + 1) * seconds_per_frame
+    count = int((duration - offset) / (period * seconds_per_frame)) + 1
+    grid = BeatGrid(bpm=bpm, offset=float(offset), count=count, score=score)
+    if beats_per_bar is None or count < beats_per_bar:
+        return grid
+
+    strengths = _sample(onset_env, phase + np.arange(count) * period)
+    usable = count // beats_per_bar * beats_per_bar
+    by_position = strengths[:usable].reshape(-1, beats_per_bar).mean(axis=0)
+    grid.beats_per_bar = beats_per_bar
+    grid.downbeat = int(np.argmax(by_position))
+    return grid
+
+def best_beat_grid(results) -> Optional[BeatGrid]:
+    """
+    Best aligned of the results' beat grids, the one to prefer when the
+    tempos disagree.
+
+    Args:
+        results (Dict[BPMAlgorithm, BPMResult]): Results of one track
+
+    Returns:
+        Optional[BeatGrid]: None if no result carries a grid
+    """
+    grids = [result.beat_grid for result in results.values() if result.beat_grid is not None]
+    return max(grids, key=lambda grid: grid.score, default=None)
@@ -0,0 +1,158 @@
+"""
+Streaming export of analysis records to JSONL, CSV and Parquet
+
+Writers take manifest-style records (see bpm_detector.batch.analyze_file)
+and write one flat row per record: file metadata, status and timing, then
+bpm, confidence and seconds for every algorithm. Rows are buffered and
+written in batches, so memory stays flat however many files are exported.
+"""
+
+import csv
+import json
+import os
+from typing import Dict, List
+from .registry import algorithm_names
+
+BASE_COLUMNS = ("path", "status", "error", "duplicate_of", "elapsed", "decode_seconds",
+                "beat_offset", "downbeat_offset", "duration", "sample_rate", "channels",
+                "format", "subtype", "size")
+
+_INTEGER_COLUMNS = ("sample_rate", "channels", "size")
+_STRING_COLUMNS = ("path", "status", "error", "duplicate_of", "format", "subtype")
+
+def file_metadata(file_path) -> Dict[str, object]:
+    """Header information of an audio file, without decoding it"""
+    import soundfile as sf
+
+    info = sf.info(file_path)
+    return {"duration": info.duration, "sample_rate": info.samplerate,
+            "channels": info.channels, "format": info.format, "subtype": info.subtype,
+            "size": os.path.getsize(file_path)}
+
+def _column_prefix(name):
+    return name.replace(" ", "_")
+
+def algorithm_columns(names=None) -> List[str]:
+    """bpm, confidence and seconds columns of each algorithm"""
+    return [f"{_column_prefix(name)}_{field}" for name in (names or algorithm_names())
+            for field in ("bpm", "confidence", "seconds")]
+
+def flatten_record(record) -> Dict[str, object]:
+    """One export row from a manifest record"""
+    row = {column: record[column] for column in ("path", "status", "error", "duplicate_of",
+                                                 "elapsed") if column in record}
+    row.update(record.get("metadata") or {})
+    grid = None
+    for name, result in (record.get("results") or {}).items():
+        row[f"{_column_prefix(name)}_bpm"] = result["bpm"]
+        row[f"{_column_prefix(name)}_confidence"] = result["confidence"]
+        candidate = result.get("beat_grid")
+        if candidate is not None and (grid is None or
+                                      candidate.get("score", 0.0) > grid.get("score", 0.0)):
+            grid = candidate
+    if grid is not None:
+        # Seconds of the first beat and the first downbeat, on the best aligned grid
+        row["beat_offset"] = grid["offset"]
+        if grid["downbeat"] is not None:
+            row["downbeat_offset"] = grid["offset"] + grid["downbeat"] * 60.0 / grid["bpm"]
+    for name, seconds in (record.get("timings") or {}).items():
+        row[f"{_column_prefix(name)}_seconds"] = seconds
+    return row
+
+class ResultWriter:
+    """Base class buffering rows and writing them `batch_size` at a time"""
+
+    def __init__(self, path, batch_size=1000, columns=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.columns = list(columns or BASE_COLUMNS + tuple(algorithm_columns()))
+        self.rows_written = 0
+        self._buffer = []
+
+    def write(self, record):
+        self._buffer.append(flatten_record(record))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+class JSONLWriter(ResultWriter):
+    def __init__(self, path, batch_size=1000, columns=None):
+        super().__init__(path, batch_size, columns)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def _write_rows(self, rows):
+        self._file.write("".join(json.dumps(row, sort_keys=True) + "\n" for row in rows))
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+class CSVWriter(ResultWriter):
+    def __init__(self, path, batch_size=1000, columns=None):
+        super().__init__(path, batch_size, columns)
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, self.columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def _write_rows(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+class ParquetWriter(ResultWriter):
+    """Writes one Parquet row group per batch; requires pyarrow"""
+
+    def __init__(self, path, batch_size=1000, columns=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+        super().__init__(path, batch_size, columns)
+        self._pa = pa
+        self._schema = pa.schema([
+            (column, pa.string() if column in _STRING_COLUMNS
+             else pa.int64() if column in _INTEGER_COLUMNS else pa.float64())
+            for column in self.columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _write_rows(self, rows):
+        rows = [{column: row.get(column) for column in self.columns} for row in rows]
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def _close(self):
+        self._writer.close()
+
+_WRITERS = {".jsonl": JSONLWriter, ".ndjson": JSONLWriter, ".csv": CSVWriter,
+            ".parquet": ParquetWriter}
+
+def open_writer(path, batch_size=1000, columns=None) -> ResultWriter:
+    """Writer for the format given by the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {extension or path} "
+                         f"(use one of {', '.join(_WRITERS)})")
+    return _WRITERS[extension](path, batch_size, columns)
@@ -0,0 +1,129 @@
+"""
+Shared intermediates the BPM detection algorithms are computed from
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+from .plan import get_analysis_plan
+from .registry import ONSET_ENVELOPE, SPECTRAL_FLUX, FRAME_ENERGIES
+from .spectral import BLOCK_FRAMES, spectral_flux, stft_magnitude
+
+def onset_strength(y, sr, hop_length=512, plan=None, workers=1):
+    """Compute onset strength envelope with improved parameters"""
+    plan = plan or get_analysis_plan(sr, hop_length=hop_length)
+
+    # Compute STFT and apply mel weighting, pooled into bands so that
+    # everything below scales with the number of bands rather than FFT bins
+    D = stft_magnitude(y, plan.stft_window, hop_length, weights=plan.band_weights,
+                       workers=workers)
+    return onset_from_bands(D, plan)
+
+def onset_from_bands(D, plan):
+    """Onset envelope from (n_bands, n_frames) band magnitudes"""
+    # Convert to log-magnitude
+    D = np.log1p(D)
+
+    # Compute first-order difference
+    onset_env = np.diff(D, axis=1)
+    onset_env = np.maximum(0, onset_env)
+
+    # Apply high-pass filter to remove DC
+    onset_env = signal.filtfilt(plan.highpass_b, plan.highpass_a, onset_env, axis=1)
+
+    # Normalize
+    onset_env = onset_env - onset_env.mean(axis=1, keepdims=True)
+    onset_env = onset_env / onset_env.std(axis=1, keepdims=True)
+    onset_env = np.mean(onset_env, axis=0)
+    onset_env = onset_env / np.max(np.abs(onset_env))
+
+    return onset_env
+
+def frame_energies(y, window, hop_length):
+    """Energy of each full frame of y after applying window"""
+    frames = sliding_window_view(y, len(window))[::hop_length]
+    energies = np.empty(len(frames))
+    for start in range(0, len(frames), BLOCK_FRAMES):
+        block = frames[start:start + BLOCK_FRAMES] * window
+        energies[start:start + len(block)] = np.sum(block ** 2, axis=1)
+    return energies
+
+class AudioFeatures:
+    """
+    Mono audio plus the intermediates derived from it.
+
+    Intermediates are computed on first request and kept, so algorithms that
+    need the same input (e.g. the onset envelope) share a single computation.
+
+    Known intermediates (e.g. from an EnvelopeStore) can be passed in. The
+    audio itself may then be given as a `loader` callable instead, which is
+    only called if an intermediate still has to be computed.
+    """
+
+    def __init__(self, audio_data, sample_rate, plan, workers=1, loader=None,
+                 intermediates=None):
+        self._audio = audio_data
+        self._loader = loader
+        self.sample_rate = sample_rate
+        self.plan = plan
+        self.workers = workers
+        self._peak = None
+        self._cache = dict(intermediates or {})
+
+    @property
+    def audio(self):
+        """Mono audio, loaded on first use when a loader was given"""
+        if self._audio is None and self._loader is not None:
+            self._audio = self._loader()
+        return self._audio
+
+    @property
+    def peak(self):
+        """Largest absolute sample"""
+        if self._peak is None:
+            self._peak = np.max(np.abs(self.audio))
+        return self._peak
+
+    def plan_for(self, min_bpm, max_bpm):
+        """The analysis plan with this front end and the given tempo range"""
+        plan = self.plan
+        if plan.min_bpm == min_bpm and plan.max_bpm == max_bpm:
+            return plan
+        return get_analysis_plan(self.sample_rate, plan.hop_length, plan.n_fft, min_bpm, max_bpm,
+                                 plan.n_bands, len(plan.kde_grid))
+
+    def get(self, name):
+        """Return an intermediate, computing it if needed"""
+        if name not in self._cache:
+            if name not in _PRODUCERS:
+                raise ValueError(f"Unknown intermediate: {name}")
+            self._cache[name] = _PRODUCERS[name](self)
+        return self._cache[name]
+
+    def computed(self):
+        """Intermediates computed so far"""
+        return dict(self._cache)
+
+def _onset_envelope(features):
+    # Band magnitudes are linear in the signal, so the peak normalization is
+    # applied to them instead of to a normalized copy of the audio. This also
+    # lets ProgressiveAnalysis build them before the peak is known
+    plan = features.plan
+    D = stft_magnitude(features.audio, plan.stft_window, plan.hop_length,
+                       weights=plan.band_weights, workers=features.workers)
+    return onset_from_bands(D / features.peak, plan)
+
+def _spectral_flux(features):
+    plan = features.plan
+    return spectral_flux(features.audio, plan.flux_frame_size, plan.hop_length, plan.n_fft,
+                         len(features.audio) // plan.hop_length, features.workers)
+
+def _frame_energies(features):
+    plan = features.plan
+    return frame_energies(features.audio, plan.web_window, plan.hop_length) / features.peak ** 2
+
+_PRODUCERS = {
+    ONSET_ENVELOPE: _onset_envelope,
+    SPECTRAL_FLUX: _spectral_flux,
+    FRAME_ENERGIES: _frame_energies,
+}
@@ -8,37 +8,52 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QRunnable, QThreadPool, pyqtSignal, QObject
 from PyQt6.QtGui import QColor, QCursor
-import soundfile as sf
-from .detector import BPMDetector, BPMAlgorithm
+from .registry import available_algorithms, get_spec
 import re
 
 class WorkerSignals(QObject):
     """Defines the signals available from a running worker thread"""
-    progress = pyqtSignal(str, dict)  # Emits filename and results
+    # Emits filename, results, whether they are final, and the timings of the final ones
+    progress = pyqtSignal(str, dict, bool, dict)
     error = pyqtSignal(str, str)  # Emits filename and error message
     finished = pyqtSignal()
 
 class BPMWorker(QRunnable):
     """Worker runnable for processing a single audio file"""
-    def __init__(self, file_path, detector):
+    def __init__(self, file_path, detector, memory_budget=None, progressive=False):
         super().__init__()
         self.file_path = file_path
         self.detector = detector
+        self.memory_budget = memory_budget  # Shared MemoryBudget of all workers
+        # Emit provisional results from the start of the track while the
+        # rest is still being analysed
+        self.progressive = progressive
         self.signals = WorkerSignals()
 
     def run(self):
         try:
-            audio_data, sample_rate = sf.read(self.file_path)
-            results = self.detector.detect_all(audio_data, sample_rate)
-            self.signals.progress.emit(
-                os.path.basename(self.file_path),
-                results  # Now passing the complete results dictionary
-            )
+            if self.memory_budget is None:
+                self.analyse()
+            else:
+                # Wait until the estimated peak fits next to the running files
+                with self.memory_budget.reserve(self.detector.estimate_file_peak(self.file_path)):
+                    self.analyse()
         except Exception as e:
             self.signals.error.emit(os.path.basename(self.file_path), str(e))
         finally:
             self.signals.finished.emit()
 
+    def analyse(self):
+        filename = os.path.basename(self.file_path)
+        timings = {}
+        if not self.progressive:
+            results = self.detector.detect_file(self.file_path, timings)
+            self.signals.progress.emit(filename, results, True, timings)
+            return
+        for _, results, final in self.detector.detect_file_progressive(self.file_path,
+                                                                       timings=timings):
+            self.signals.progress.emit(filename, results, final, timings if final else {})
+
 class DropArea(QLabel):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -85,11 +100,17 @@ class DropArea(QLabel):
 class BPMDetectorGUI(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.detector = BPMDetector(min_bpm=92, max_bpm=184)
+        self.detector = None  # Created on first use, see create_detector
+        self.memory_budget = None
         self.thread_pool = QThreadPool()
         self.active_workers = 0
         self.file_paths = {}  # Store original file paths
         self.selected_bpms = {}  # Store selected BPM for each file
+        self.selected_sources = {}  # Algorithm name behind each selected BPM
+        self.manual_selections = set()  # Files whose BPM the user picked by hand
+        self.file_results = {}  # Filename -> detect_file results, the source for all cells
+        self.file_timings = {}  # Filename -> seconds per algorithm and decoding, for export
+        self.algorithms = available_algorithms()  # One result column per algorithm
         self.init_ui()
 
     def init_ui(self):
@@ -231,6 +252,13 @@ class BPMDetectorGUI(QMainWindow):
         self.rename_button.clicked.connect(self.rename_files)
         self.rename_button.setEnabled(False)
         options_layout.addWidget(self.rename_button)
+
+        # Export results button
+        self.export_button = QPushButton("Export Results")
+        self.export_button.setStyleSheet(self.rename_button.styleSheet())
+        self.export_button.clicked.connect(self.export_results)
+        self.export_button.setEnabled(False)
+        options_layout.addWidget(self.export_button)
         
         options_layout.addStretch()
         layout.addLayout(options_layout)
@@ -254,8 +282,8 @@ class BPMDetectorGUI(QMainWindow):
 
         # Results table
         self.results_table = QTableWidget()
-        self.results_table.setColumnCount(len(BPMAlgorithm) + 2)  # +2 for filename and selected BPM
-        headers = ["File"] + [algo.value for algo in BPMAlgorithm] + ["Selected BPM"]
+        self.results_table.setColumnCount(len(self.algorithms) + 2)  # +2 for filename and selected BPM
+        headers = ["File"] + [spec.name for spec in self.algorithms] + ["Selected BPM"]
         self.results_table.setHorizontalHeaderLabels(headers)
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
         self.results_table.setStyleSheet("""
@@ -294,11 +322,32 @@ class BPMDetectorGUI(QMainWindow):
                 self.max_bpm_spin.setValue(min_bpm + 1)
             return
         
-        self.detector = BPMDetector(min_bpm=min_bpm, max_bpm=max_bpm)
+        self.detector = None
+
+    def create_detector(self):
+        # Imported here so the window shows before numpy/scipy are loaded
+        from .detector import BPMDetector
+        from .memory import MemoryBudget, physical_memory
+
+        # Leave half of the machine's memory to everything else; a file that
+        # would not fit next to the others on its own is decoded in chunks
+        total = physical_memory() // 2
+        if total and self.memory_budget is None:
+            self.memory_budget = MemoryBudget(total)
+        per_file = total // self.thread_pool.maxThreadCount() if total else None
+        return BPMDetector(min_bpm=self.min_bpm_spin.value(), max_bpm=self.max_bpm_spin.value(),
+                           memory_budget=per_file)
 
     def process_files(self, files):
+        if self.detector is None:
+            self.detector = self.create_detector()
+
         # Clear selected BPMs
         self.selected_bpms.clear()
+        self.selected_sources.clear()
+        self.manual_selections.clear()
+        self.file_results.clear()
+        self.file_timings.clear()
         
         # Store original file paths
         self.file_paths.clear()
@@ -332,7 +381,7 @@ class BPMDetectorGUI(QMainWindow):
                 self.results_table.setItem(i, j, processing_item)
             
             # Create and start worker for this file
-            worker = BPMWorker(file_path, self.detector)
+            worker = BPMWorker(file_path, self.detector, self.memory_budget, progressive=True)
             worker.signals.progress.connect(self.update_results)
             worker.signals.error.connect(self.handle_error)
             worker.signals.finished.connect(self.worker_finished)
@@ -359,41 +408,62 @@ class BPMDetectorGUI(QMainWindow):
         if self.active_workers == 0:
             self.progress.hide()
             self.rename_button.setEnabled(True)
+            self.export_button.setEnabled(bool(self.file_results))
+
+    def format_bpm(self, bpm):
+        """BPM text following the rounding option"""
+        if self.round_bpm_checkbox.isChecked():
+            return f"{round(bpm):.0f}"
+        return f"{bpm:.1f}"
+
+    def best_result(self, filename):
+        """(algorithm name, BPMResult) with the highest confidence, or None"""
+        candidates = [(result.confidence, get_spec(algo).name, result)
+                      for algo, result in self.file_results.get(filename, {}).items()
+                      if result and result.bpm > 0]
+        if not candidates:
+            return None
+        _, name, result = max(candidates, key=lambda candidate: candidate[0])
+        return name, result
+
+    def update_selection_button(self, row, filename):
+        button = self.results_table.cellWidget(row, self.results_table.columnCount() - 1)
+        bpm = self.selected_bpms.get(filename)
+        if not isinstance(button, QPushButton) or bpm is None:
+            return
+        button.setText(f"Selected: {self.format_bpm(bpm)} BPM ({self.selected_sources[filename]})")
+        button.setStyleSheet("""
+            QPushButton {
+                background-color: #4CAF50;
+                color: white;
+                border: none;
+                padding: 5px;
+                border-radius: 3px;
+            }
+            QPushButton:hover {
+                background-color: #45a049;
+            }
+        """)
 
-    def update_results(self, filename, results):
+    def update_results(self, filename, results, final=True, timings=None):
         # Find the row for this file
         for row in range(self.results_table.rowCount()):
             if self.results_table.item(row, 0).text() == filename:
-                # Find the highest confidence result first
-                best_bpm = None
-                best_confidence = -1
-                best_algo = None
-                
-                for algo, result in results.items():
-                    if result and result.bpm > 0 and result.confidence > best_confidence:
-                        best_confidence = result.confidence
-                        best_bpm = result.bpm
-                        best_algo = algo
-                
+                self.file_results[filename] = results
+                if final:
+                    self.file_timings[filename] = timings or {}
+
                 # Update results for each algorithm
-                for col, algo in enumerate(BPMAlgorithm, start=1):
-                    result = results.get(algo)
+                for col, spec in enumerate(self.algorithms, start=1):
+                    result = results.get(spec.key)
                     
                     if result and result.bpm > 0:
-                        # Handle BPM rounding
-                        bpm_value = result.bpm
-                        if self.round_bpm_checkbox.isChecked():
-                            bpm_value = round(bpm_value)
-                            bpm_text = f"{bpm_value:.0f}"
-                        else:
-                            bpm_text = f"{bpm_value:.1f}"
-                        
                         # Create cell text with BPM and confidence percentage
-                        cell_text = f"{bpm_text} BPM\n{result.confidence:.1%}"
+                        cell_text = f"{self.format_bpm(result.bpm)} BPM\n{result.confidence:.1%}"
                         item = QTableWidgetItem(cell_text)
                         
-                        # Store the actual BPM value in item data for later use
-                        item.setData(Qt.ItemDataRole.UserRole, bpm_value)
+                        # Store the unrounded BPM value in item data for later use
+                        item.setData(Qt.ItemDataRole.UserRole, result.bpm)
                         
                         # Color coding based on confidence
                         if result.confidence >= 0.6:  # Above 60%
@@ -413,6 +483,12 @@ class BPMDetectorGUI(QMainWindow):
                         item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
                         item.setBackground(QColor(bg_color))
                         item.setForeground(QColor(color))
+                        if not final:
+                            # Provisional: shown in italics until the whole track is done
+                            font = item.font()
+                            font.setItalic(True)
+                            item.setFont(font)
+                            item.setToolTip("Provisional, refined as more audio is analysed")
                     else:
                         item = QTableWidgetItem("No result")
                         item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -421,33 +497,28 @@ class BPMDetectorGUI(QMainWindow):
                     item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
                     self.results_table.setItem(row, col, item)
                 
-                # Add "Select BPM" button in the last column and auto-select best result
-                select_button = QPushButton("Select BPM")
-                select_button.clicked.connect(lambda checked, r=row: self.select_bpm(r))
-                
-                # If we found a best result, auto-select it
-                if best_bpm is not None:
-                    self.selected_bpms[filename] = best_bpm
-                    if self.round_bpm_checkbox.isChecked():
-                        best_bpm = round(best_bpm)
-                        bpm_text = f"{best_bpm:.0f}"
-                    else:
-                        bpm_text = f"{best_bpm:.1f}"
-                    select_button.setText(f"Selected: {bpm_text} BPM ({best_algo.value})")
-                    select_button.setStyleSheet("""
-                        QPushButton {
-                            background-color: #4CAF50;
-                            color: white;
-                            border: none;
-                            padding: 5px;
-                            border-radius: 3px;
-                        }
-                        QPushButton:hover {
-                            background-color: #45a049;
-                        }
-                    """)
-                
-                self.results_table.setCellWidget(row, self.results_table.columnCount() - 1, select_button)
+                # Add "Select BPM" button in the last column once; provisional
+                # updates keep it
+                button_column = self.results_table.columnCount() - 1
+                if self.results_table.cellWidget(row, button_column) is None:
+                    select_button = QPushButton("Select BPM")
+                    select_button.clicked.connect(lambda checked, r=row: self.select_bpm(r))
+                    self.results_table.setCellWidget(row, button_column, select_button)
+
+                if filename in self.manual_selections:
+                    # Keep the algorithm the user picked, with its refined value
+                    picked = next((result for algo, result in results.items()
+                                   if get_spec(algo).name == self.selected_sources[filename]
+                                   and result.bpm > 0), None)
+                    if picked is not None:
+                        self.selected_bpms[filename] = picked.bpm
+                else:
+                    # Otherwise auto-select the best result
+                    best = self.best_result(filename)
+                    if best is not None:
+                        self.selected_sources[filename], result = best
+                        self.selected_bpms[filename] = result.bpm
+                self.update_selection_button(row, filename)
                 break
 
     def select_bpm(self, row):
@@ -455,34 +526,23 @@ class BPMDetectorGUI(QMainWindow):
         menu = QMenu(self)
         
         # Add options for each algorithm's result
-        for col, algo in enumerate(BPMAlgorithm, start=1):
+        for col, spec in enumerate(self.algorithms, start=1):
             item = self.results_table.item(row, col)
             if item and "BPM" in item.text():
                 bpm_value = item.data(Qt.ItemDataRole.UserRole)
-                action = menu.addAction(f"{algo.value}: {bpm_value:.1f} BPM")
-                action.setData((filename, bpm_value))
+                action = menu.addAction(f"{spec.name}: {bpm_value:.1f} BPM")
+                action.setData((filename, bpm_value, spec.name))
         
         # Show menu and handle selection
         action = menu.exec(QCursor.pos())
         if action:
-            filename, bpm = action.data()
+            filename, bpm, source = action.data()
             self.selected_bpms[filename] = bpm
+            self.selected_sources[filename] = source
+            self.manual_selections.add(filename)
             
             # Update the button text to show selected BPM
-            button = self.results_table.cellWidget(row, self.results_table.columnCount() - 1)
-            button.setText(f"Selected: {bpm:.1f} BPM")
-            button.setStyleSheet("""
-                QPushButton {
-                    background-color: #4CAF50;
-                    color: white;
-                    border: none;
-                    padding: 5px;
-                    border-radius: 3px;
-                }
-                QPushButton:hover {
-                    background-color: #45a049;
-                }
-            """)
+            self.update_selection_button(row, filename)
 
     def rename_files(self):
         try:
@@ -497,30 +557,11 @@ class BPMDetectorGUI(QMainWindow):
                 if selected_bpm is not None:
                     best_bpm = selected_bpm
                 else:
-                    # Existing logic to find highest confidence BPM
-                    best_bpm = None
-                    best_confidence = -1
-                    
-                    for col, algo in enumerate(BPMAlgorithm, start=1):
-                        cell_item = self.results_table.item(row, col)
-                        if cell_item and "BPM" in cell_item.text():
-                            try:
-                                bpm = cell_item.data(Qt.ItemDataRole.UserRole)
-                                confidence = float(cell_item.text().split('\n')[1].rstrip('%')) / 100
-                                
-                                if confidence > best_confidence:
-                                    best_confidence = confidence
-                                    best_bpm = bpm
-                            except (ValueError, IndexError):
-                                continue
+                    best = self.best_result(filename)
+                    best_bpm = best[1].bpm if best is not None else None
 
                 if best_bpm is not None:
-                    # Round BPM if checkbox is checked
-                    if self.round_bpm_checkbox.isChecked():
-                        best_bpm = round(best_bpm)
-                        bpm_text = f"{best_bpm:.0f}"
-                    else:
-                        bpm_text = f"{best_bpm:.1f}"
+                    bpm_text = self.format_bpm(best_bpm)
                     
                     # Create new filename with BPM
                     dir_path = os.path.dirname(original_path)
@@ -540,6 +581,13 @@ class BPMDetectorGUI(QMainWindow):
                     
                     # Update the table and stored path
                     self.file_paths[new_name] = new_path
+                    for per_file in (self.file_results, self.file_timings, self.selected_bpms,
+                                     self.selected_sources):
+                        if filename in per_file:
+                            per_file[new_name] = per_file.pop(filename)
+                    if filename in self.manual_selections:
+                        self.manual_selections.discard(filename)
+                        self.manual_selections.add(new_name)
                     self.results_table.item(row, 0).setText(new_name)
 
             QMessageBox.information(self, "Success", "Files have been renamed successfully!")
@@ -550,44 +598,39 @@ class BPMDetectorGUI(QMainWindow):
     def on_round_bpm_changed(self):
         """Update all displayed BPM values when rounding option changes"""
         for row in range(self.results_table.rowCount()):
-            for col, algo in enumerate(BPMAlgorithm, start=1):
+            filename = self.results_table.item(row, 0).text()
+            results = self.file_results.get(filename, {})
+            for col, spec in enumerate(self.algorithms, start=1):
+                result = results.get(spec.key)
                 item = self.results_table.item(row, col)
-                if item and "BPM" in item.text():
-                    # Get the stored BPM value
-                    bpm_value = item.data(Qt.ItemDataRole.UserRole)
-                    if bpm_value is not None:
-                        # Format BPM based on checkbox state
-                        if self.round_bpm_checkbox.isChecked():
-                            bpm_value = round(bpm_value)
-                            bpm_text = f"{bpm_value:.0f}"
-                        else:
-                            bpm_text = f"{bpm_value:.1f}"
-                        
-                        # Get the confidence from existing text
-                        confidence = float(item.text().split('\n')[1].rstrip('%')) / 100
-                        
-                        # Update the display
-                        cell_text = f"{bpm_text} BPM\n{confidence:.1%}"
-                        item.setText(cell_text)
-            
+                if item and result and result.bpm > 0:
+                    item.setText(f"{self.format_bpm(result.bpm)} BPM\n{result.confidence:.1%}")
+
             # Update selected BPM button if exists
-            button = self.results_table.cellWidget(row, self.results_table.columnCount() - 1)
-            if isinstance(button, QPushButton) and "Selected:" in button.text():
-                # Extract just the BPM value from the button text
-                # Button text format: "Selected: 140.1 BPM (algorithm)"
-                try:
-                    bpm_text = button.text().split(': ')[1]  # Get everything after "Selected: "
-                    bpm_text = bpm_text.split(' BPM')[0]     # Get just the number before " BPM"
-                    bpm_value = float(bpm_text)
-                    algo_name = button.text().split('(')[1].rstrip(')')  # Get algorithm name
-                    
-                    if self.round_bpm_checkbox.isChecked():
-                        bpm_value = round(bpm_value)
-                        button.setText(f"Selected: {bpm_value:.0f} BPM ({algo_name})")
-                    else:
-                        button.setText(f"Selected: {bpm_value:.1f} BPM ({algo_name})")
-                except (ValueError, IndexError):
-                    continue
+            self.update_selection_button(row, filename)
+
+    def export_results(self):
+        """Write the results of all analysed files to JSONL, CSV or Parquet"""
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Results", "bpm_results.csv",
+            "CSV (*.csv);;JSON Lines (*.jsonl);;Parquet (*.parquet)"
+        )
+        if not path:
+            return
+        try:
+            from .batch import results_to_dict
+            from .export import file_metadata, open_writer
+
+            with open_writer(path) as writer:
+                for filename, results in self.file_results.items():
+                    file_path = self.file_paths[filename]
+                    writer.write({"path": file_path, "status": "ok",
+                                  "results": results_to_dict(results),
+                                  "timings": self.file_timings.get(filename, {}),
+                                  "metadata": file_metadata(file_path)})
+            QMessageBox.information(self, "Success", f"Exported {len(self.file_results)} files")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error exporting results: {str(e)}")
 
 def main():
     app = QApplication(sys.argv)
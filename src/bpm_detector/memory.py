@@ -0,0 +1,104 @@
+"""
+Peak-memory estimates and a budget that limits how much analysis runs at once
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# Frames decoded per read on the chunked path
+CHUNK_FRAMES = 1 << 18
+
+# Copies of the (rows, frames) onset matrix alive at once: magnitudes, log,
+# difference and the filtered result
+_ENVELOPE_COPIES = 4
+
+def estimate_peak_bytes(frames, channels, hop_length=512, n_fft=2048, n_bands=64,
+                        chunked=False) -> int:
+    """
+    Estimate the peak memory of analysing one track with all algorithms.
+
+    Args:
+        frames (int): Samples per channel
+        channels (int): Channel count
+        hop_length, n_fft, n_bands: Front-end parameters of the analysis plan
+        chunked (bool): Whether the track is decoded chunk by chunk into mono
+
+    Returns:
+        int: Estimated peak in bytes
+    """
+    from .spectral import BLOCK_FRAMES
+
+    if chunked:
+        decoded = min(frames, CHUNK_FRAMES) * channels * 8 + frames * 8
+    else:
+        # Full float64 decode, plus the mono mix of multichannel audio
+        decoded = frames * channels * 8 + (frames * 8 if channels > 1 else 0)
+    rows = n_bands or n_fft // 2 + 1
+    envelope = rows * (frames // hop_length + 1) * 8 * _ENVELOPE_COPIES
+    # Windowed frames, complex spectrum and magnitudes of one FFT block
+    fft_block = BLOCK_FRAMES * (n_fft * 8 + (n_fft // 2 + 1) * 24)
+    return decoded + envelope + fft_block
+
+def mixdown(audio):
+    """
+    Mono mix of (frames, channels) audio, equal to np.mean(audio, axis=1).
+    Stereo is summed column by column, ~3x faster than the strided reduction.
+    """
+    if audio.shape[1] != 2:
+        return np.mean(audio, axis=1)
+    mono = audio[:, 0] + audio[:, 1]
+    mono /= 2
+    return mono
+
+def read_mono(sound_file, chunk_frames=CHUNK_FRAMES):
+    """
+    Decode the rest of an open SoundFile into a float64 mono array, one chunk
+    at a time, so the full multichannel decode never exists in memory.
+    """
+    mono = np.empty(sound_file.frames - sound_file.tell())
+    position = 0
+    for block in sound_file.blocks(chunk_frames, always_2d=True):
+        mono[position:position + len(block)] = mixdown(block)
+        position += len(block)
+    return mono[:position]
+
+def physical_memory() -> int:
+    """Installed memory in bytes, 0 if it cannot be determined"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+class MemoryBudget:
+    """
+    Admission control for concurrent analyses.
+
+    Work reserves its estimated peak before starting and blocks while the
+    reservations of running work would exceed the budget. A single job
+    larger than the whole budget still runs, but only on its own.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.reserved = 0
+        self.running = 0
+        self._condition = threading.Condition()
+
+    def fits(self, nbytes) -> bool:
+        return self.running == 0 or self.reserved + nbytes <= self.limit_bytes
+
+    @contextmanager
+    def reserve(self, nbytes):
+        with self._condition:
+            self._condition.wait_for(lambda: self.fits(nbytes))
+            self.reserved += nbytes
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.reserved -= nbytes
+                self.running -= 1
+                self._condition.notify_all()
@@ -0,0 +1,339 @@
+"""
+Counters, gauges and histograms for batch and service runs
+
+Instruments live in a MetricsRegistry and are exported as Prometheus text
+(for the node_exporter textfile collector or a /metrics endpoint) or as JSON
+snapshots. Recording takes a lock and a dictionary update, so it is cheap
+enough to do per file. No collector is needed: MetricsReporter writes the
+files periodically from a background thread.
+"""
+
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+# Names of the metrics recorded by record_analysis, BatchJob and AnalysisService
+FILES = "bpm_files_total"  # label status
+ERRORS = "bpm_errors_total"  # label exception
+DECODE_SECONDS = "bpm_decode_seconds"
+ANALYSIS_SECONDS = "bpm_analysis_seconds"  # File time minus decoding
+ALGORITHM_SECONDS = "bpm_algorithm_seconds"  # label algorithm
+CACHE_REQUESTS = "bpm_cache_requests_total"  # labels cache and result (hit or miss)
+QUEUE_DEPTH = "bpm_queue_depth"
+REQUEST_SECONDS = "bpm_request_seconds"  # Service requests, submit to result
+RESIDENT_BYTES = "bpm_process_resident_bytes"
+PEAK_RESIDENT_BYTES = "bpm_process_peak_resident_bytes"  # label process (self or children)
+
+# Seconds, from a short excerpt to a long track on a slow machine
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Monotonically increasing count, per combination of labels"""
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = _label_key(labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def total(self) -> float:
+        """Sum over all label combinations"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def to_prometheus(self):
+        return self._header() + [f"{self.name}{_format_labels(key)} {_format_value(value)}"
+                                 for key, value in self.samples()]
+
+    def to_dict(self):
+        return [{"labels": dict(key), "value": value} for key, value in self.samples()]
+
+class Gauge(Counter):
+    """Value that can go up and down, or is read from a function when collected"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def set_function(self, func, **labels):
+        """Read the value from func() whenever the gauge is collected"""
+        with self._lock:
+            self._functions[_label_key(labels)] = func
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, func in functions:
+            values[key] = float(func())
+        return sorted(values.items())
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their count and sum"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (not cumulative) plus the +Inf bucket, sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        """(labels, cumulative bucket counts, count, sum)"""
+        with self._lock:
+            items = sorted((key, list(counts), total) for key, (counts, total)
+                           in self._values.items())
+        samples = []
+        for key, counts, total in items:
+            cumulative = []
+            running = 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            samples.append((key, cumulative, running, total))
+        return samples
+
+    def to_prometheus(self):
+        lines = self._header()
+        for key, cumulative, count, total in self.samples():
+            for bound, bucket_count in zip(self.buckets + (math.inf,), cumulative):
+                labels = _format_labels(key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def to_dict(self):
+        return [{"labels": dict(key), "count": count, "sum": total,
+                 "buckets": {_format_value(bound): n for bound, n
+                             in zip(self.buckets + (math.inf,), cumulative)}}
+                for key, cumulative, count, total in self.samples()]
+
+def rss_bytes() -> int:
+    """Current resident set size of this process, 0 where unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def peak_rss_bytes(children=False) -> int:
+    """Peak resident set size of this process, or of its finished children"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class MetricsRegistry:
+    """
+    Named instruments of one process.
+
+    counter(), gauge() and histogram() return the existing instrument of
+    that name, so recording code does not need to hold on to it. Resident
+    memory gauges are registered from the start.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.gauge(RESIDENT_BYTES, "Resident memory of this process").set_function(rss_bytes)
+        peak = self.gauge(PEAK_RESIDENT_BYTES, "Peak resident memory")
+        peak.set_function(peak_rss_bytes, process="self")
+        peak.set_function(lambda: peak_rss_bytes(children=True), process="children")
+
+    def _get(self, cls, name, help_text, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, *args)
+            elif type(metric) is not cls:
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text="") -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text="") -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets)
+
+    def get(self, name):
+        """Registered instrument, or None"""
+        return self._metrics.get(name)
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(line + "\n" for metric in metrics for line in metric.to_prometheus())
+
+    def snapshot(self) -> dict:
+        """JSON-serializable state of all metrics"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {"time": time.time(), "uptime": time.time() - self.started,
+                "metrics": {metric.name: {"type": metric.kind, "values": metric.to_dict()}
+                            for metric in metrics}}
+
+    def write_prometheus(self, path):
+        """Replace `path` atomically, so a collector never reads a partial file"""
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+def record_analysis(registry, record):
+    """Record one manifest-style record (see bpm_detector.batch.analyze_file)"""
+    from .detector import DECODE_TIMING
+
+    registry.counter(FILES, "Files analysed, by status").inc(status=record["status"])
+    if record["status"] != "ok":
+        registry.counter(ERRORS, "Failed analyses, by exception type").inc(
+            exception=record.get("error_type", "Exception"))
+    if "duplicate_of" in record:
+        return  # Nothing was decoded or analysed
+    timings = dict(record.get("timings") or {})
+    decode = timings.pop(DECODE_TIMING, None)
+    if decode is not None:
+        registry.histogram(DECODE_SECONDS, "Seconds spent decoding audio per file").observe(decode)
+    if "elapsed" in record:
+        registry.histogram(ANALYSIS_SECONDS, "Seconds spent analysing per file, "
+                           "excluding decoding").observe(max(0.0, record["elapsed"] - (decode or 0.0)))
+    algorithm_seconds = registry.histogram(ALGORITHM_SECONDS, "Seconds per algorithm and file")
+    for name, seconds in timings.items():
+        algorithm_seconds.observe(seconds, algorithm=name)
+
+class MetricsReporter:
+    """
+    Writes the registry every `interval` seconds from a background thread,
+    and once more when stopped.
+
+    Args:
+        registry (MetricsRegistry): Metrics to write
+        prometheus_path (str): Optional text-format file, replaced each time
+        json_path (str): Optional JSONL file, one snapshot appended each time.
+            Snapshots add files_per_second over the last interval and the
+            cache hit rate so far
+        interval (float): Seconds between writes
+    """
+
+    def __init__(self, registry, prometheus_path=None, json_path=None, interval=10.0):
+        self.registry = registry
+        self.prometheus_path = prometheus_path
+        self.json_path = json_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = (time.perf_counter(), 0.0)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        if self.prometheus_path:
+            self.registry.write_prometheus(self.prometheus_path)
+        if self.json_path:
+            snapshot = self.registry.snapshot()
+            snapshot.update(self._derived())
+            with open(self.json_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+    def _derived(self):
+        files = self.registry.get(FILES)
+        count = files.total() if files is not None else 0.0
+        now = time.perf_counter()
+        last_time, last_count = self._last
+        self._last = (now, count)
+        derived = {"files_per_second": (count - last_count) / (now - last_time)
+                   if now > last_time else 0.0}
+        cache = self.registry.get(CACHE_REQUESTS)
+        requests = cache.total() if cache is not None else 0.0
+        hits = sum(value for key, value in (cache.samples() if cache is not None else ())
+                   if ("result", "hit") in key)
+        derived["cache_hit_rate"] = hits / requests if requests else None
+        errors = self.registry.get(ERRORS)
+        derived["error_rate"] = errors.total() / count if errors is not None and count else 0.0
+        return derived
@@ -0,0 +1,102 @@
+"""
+Precomputed constants shared by the BPM detection algorithms
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+
+@dataclass(frozen=True, eq=False)
+class AnalysisPlan:
+    """Windows, filters and frame bounds for one set of analysis parameters"""
+    sample_rate: int
+    hop_length: int
+    n_fft: int
+    min_bpm: float
+    max_bpm: float
+    n_bands: int
+    # Onset envelope
+    stft_window: np.ndarray  # Periodic Hann, as used by scipy.signal.stft
+    band_weights: np.ndarray  # (n_bands, n_bins) pooled mel-domain smoothing
+    highpass_b: np.ndarray  # Butterworth high-pass applied to the envelope
+    highpass_a: np.ndarray
+    # Autocorrelation
+    min_lag: int
+    max_lag: int
+    # Energy flux
+    flux_frame_size: int
+    flux_peak_distance: int
+    # Web style
+    web_window: np.ndarray
+    web_peak_distance: int
+    kde_grid: np.ndarray
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+def _mel_weights(sample_rate, n_fft):
+    freqs = np.linspace(0, sample_rate / 2, n_fft // 2 + 1)
+    mel_f = 2595 * np.log10(1 + freqs / 700)
+    mel_weights = np.exp(-0.5 * ((mel_f[:, np.newaxis] - mel_f) / (mel_f[1] - mel_f[0])) ** 2)
+    return mel_weights / mel_weights.sum(axis=1, keepdims=True)
+
+def _band_weights(sample_rate, n_fft, n_bands):
+    # Each band averages the smoothing rows of a contiguous group of bins, so
+    # the onset pipeline runs on n_bands rows instead of one row per bin.
+    mel_weights = _mel_weights(sample_rate, n_fft)
+    if n_bands is None or n_bands >= len(mel_weights):
+        return mel_weights
+    groups = np.array_split(np.arange(len(mel_weights)), n_bands)
+    return np.stack([mel_weights[group].mean(axis=0) for group in groups])
+
+def get_analysis_plan(sample_rate, hop_length=512, n_fft=2048, min_bpm=92, max_bpm=184,
+                      n_bands=64, grid_points=200):
+    """
+    Return the analysis plan for the given parameters.
+
+    Plans are memoized, so every algorithm and worker thread analysing audio
+    with the same parameters shares one instance. Its arrays are read-only.
+
+    Args:
+        sample_rate (int): Sample rate of the audio
+        hop_length (int): Hop between analysis frames in samples
+        n_fft (int): FFT size
+        min_bpm (float): Lower bound of the tempo range
+        max_bpm (float): Upper bound of the tempo range
+        n_bands (int): Number of frequency bands in the onset envelope,
+            or None to keep one band per FFT bin
+        grid_points (int): Resolution of the tempo grid searched by the web
+            style algorithm
+
+    Returns:
+        AnalysisPlan: Precomputed constants
+    """
+    # lru_cache keys positional and keyword calls differently; always pass
+    # every argument positionally so both styles share one plan
+    return _build_plan(sample_rate, hop_length, n_fft, min_bpm, max_bpm, n_bands, grid_points)
+
+@lru_cache(maxsize=32)
+def _build_plan(sample_rate, hop_length, n_fft, min_bpm, max_bpm, n_bands, grid_points):
+    b, a = signal.butter(2, 0.1, btype='high', fs=sample_rate / hop_length)
+    band_weights = _band_weights(sample_rate, n_fft, n_bands)
+    return AnalysisPlan(
+        sample_rate=sample_rate,
+        hop_length=hop_length,
+        n_fft=n_fft,
+        min_bpm=min_bpm,
+        max_bpm=max_bpm,
+        n_bands=len(band_weights),
+        stft_window=_readonly(signal.get_window('hann', n_fft)),
+        band_weights=_readonly(band_weights),
+        highpass_b=_readonly(b),
+        highpass_a=_readonly(a),
+        min_lag=int(60.0 * sample_rate / (hop_length * max_bpm)),
+        max_lag=int(60.0 * sample_rate / (hop_length * min_bpm)),
+        flux_frame_size=n_fft // 2,
+        flux_peak_distance=int(0.3 * sample_rate / hop_length),
+        web_window=_readonly(np.hanning(n_fft)),
+        web_peak_distance=int(0.35 * sample_rate / hop_length),
+        kde_grid=_readonly(np.linspace(min_bpm, max_bpm, grid_points)),
+    )
@@ -0,0 +1,45 @@
+"""
+Named analysis profiles trading speed for precision
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+@dataclass(frozen=True)
+class QualityProfile:
+    name: str
+    sample_rate: Optional[int]  # Audio is resampled to this rate first; None keeps it
+    hop_length: int  # Samples between envelope frames
+    n_fft: int
+    n_bands: Optional[int]  # Onset envelope bands; None keeps one per FFT bin
+    grid_points: int  # Resolution of the web style tempo grid
+    algorithms: Optional[Tuple[str, ...]] = None  # Registry names; None runs all
+
+    def plan_options(self):
+        """Keyword arguments of get_analysis_plan set by this profile"""
+        return {"hop_length": self.hop_length, "n_fft": self.n_fft, "n_bands": self.n_bands,
+                "grid_points": self.grid_points}
+
+PROFILES = {
+    # Triage: 11.025 kHz keeps the onsets that matter for tempo, and a hop of
+    # 128 samples is ~12 ms, like the standard hop at 44.1 kHz
+    "draft": QualityProfile("draft", sample_rate=11025, hop_length=128, n_fft=512,
+                            n_bands=16, grid_points=100,
+                            algorithms=("autocorrelation", "web style")),
+    "standard": QualityProfile("standard", sample_rate=None, hop_length=512, n_fft=2048,
+                               n_bands=64, grid_points=200),
+    # Final tagging: twice the envelope rate and a fine tempo grid
+    "precise": QualityProfile("precise", sample_rate=None, hop_length=256, n_fft=2048,
+                              n_bands=64, grid_points=2000),
+}
+
+DEFAULT_PROFILE = "standard"
+
+def get_profile(profile) -> QualityProfile:
+    """Profile by name, or the profile itself"""
+    if isinstance(profile, QualityProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown profile: {profile} (use one of {', '.join(PROFILES)})")
@@ -0,0 +1,198 @@
+"""
+Front end fed chunk by chunk, for provisional results before a file is read
+"""
+
+import math
+import numpy as np
+from scipy import signal
+from .features import AudioFeatures, frame_energies, onset_from_bands
+from .registry import ONSET_ENVELOPE, SPECTRAL_FLUX, FRAME_ENERGIES
+from .spectral import (BLOCK_FRAMES, flux_spectra, positive_flux, stft_block,
+                       stft_frame_count)
+
+class StreamResampler:
+    """
+    resample_poly applied to a stream of chunks.
+
+    Each call resamples the new input together with enough context on both
+    sides that the filter never sees the chunk edges, so the concatenated
+    output matches resampling the whole signal at once.
+    """
+
+    def __init__(self, source_rate, target_rate):
+        divisor = math.gcd(int(source_rate), int(target_rate))
+        self.up = int(target_rate) // divisor
+        self.down = int(source_rate) // divisor
+        # resample_poly's filter reaches 10 * max(up, down) upsampled samples
+        # to each side; keep whole input periods of context beyond that
+        reach = 10 * max(self.up, self.down) / self.up
+        self.margin = self.down * (math.ceil(reach / self.down) + 1)
+        self._buffer = np.zeros(0)
+        self._buffer_start = 0  # Input index of _buffer[0]
+        self._received = 0
+        self._emitted = 0  # Output samples returned so far
+
+    def push(self, samples, final=False):
+        """Resampled output that is now complete; final flushes the rest"""
+        self._buffer = np.concatenate((self._buffer, samples))
+        self._received += len(samples)
+        if final:
+            end = -(-self._received * self.up // self.down)
+            stop = self._received
+        else:
+            # Output up to a whole period whose filter support has arrived
+            periods = (self._received - self.margin) // self.down
+            end = periods * self.up
+            stop = periods * self.down + self.margin
+        if end <= self._emitted:
+            return np.zeros(0)
+
+        # Start the window a margin before the first pending output, on a
+        # period boundary so output indices stay aligned
+        window_start = max(0, self._emitted // self.up * self.down - self.margin)
+        window = self._buffer[window_start - self._buffer_start:stop - self._buffer_start]
+        resampled = signal.resample_poly(window, self.up, self.down)
+        first = window_start * self.up // self.down
+        output = resampled[self._emitted - first:end - first]
+        self._emitted = end
+
+        keep_from = max(0, end // self.up * self.down - self.margin)
+        self._buffer = self._buffer[keep_from - self._buffer_start:]
+        self._buffer_start = keep_from
+        return output
+
+class ProgressiveAnalysis:
+    """
+    Builds the shared intermediates of a track from consecutive chunks of
+    mono audio at the analysis rate.
+
+    STFT band magnitudes, spectral flux and frame energies are computed in
+    the same blocks as the one-shot functions, as soon as each block's
+    samples have arrived, and never recomputed. snapshot() turns what has
+    been processed so far into AudioFeatures; only the cheap steps after
+    the transforms (log, filtering, normalization) are redone per snapshot.
+    Samples no block needs any more are dropped, so memory stays flat
+    unless `keep_audio` asks for the full track.
+    """
+
+    def __init__(self, sample_rate, plan, workers=1, keep_audio=False):
+        self.sample_rate = sample_rate
+        self.plan = plan
+        self.workers = workers
+        self.keep_audio = keep_audio
+        self.received = 0
+        self.peak = 0.0
+        self._chunks = []  # Whole track, only with keep_audio
+        self._tail = np.zeros(0)
+        self._tail_start = 0  # Sample index of _tail[0]
+        self._scaled_window = plan.stft_window / plan.stft_window.sum()
+        self._bands = []  # STFT blocks of band magnitudes
+        self._stft_frames = 0
+        self._flux = []
+        self._flux_frames = 0
+        self._previous_spectrum = None
+        self._energies = []
+        self._energy_frames = 0
+        self._finished = False
+
+    @property
+    def seconds(self):
+        """Audio received so far, in seconds"""
+        return self.received / self.sample_rate
+
+    def push(self, samples):
+        """Add the next chunk and process every block it completes"""
+        if self._finished:
+            raise ValueError("Analysis already finished")
+        samples = np.asarray(samples, dtype=np.float64)
+        if self.keep_audio:
+            self._chunks.append(samples)
+        if len(samples):
+            self.peak = max(self.peak, float(np.max(np.abs(samples))))
+        self._tail = np.concatenate((self._tail, samples))
+        self.received += len(samples)
+        self._process()
+
+    def finish(self):
+        """Process the frames that run past the end of the track"""
+        if not self._finished:
+            self._finished = True
+            self._process(final=True)
+
+    def _available(self, extent):
+        """Frames spanning `extent` samples from their start that have fully arrived"""
+        return max(0, (self.received - extent) // self.plan.hop_length + 1)
+
+    def _process(self, final=False):
+        plan = self.plan
+        hop = plan.hop_length
+        n_fft = plan.n_fft
+        received = self.received
+
+        if final:
+            stft_total = stft_frame_count(received, n_fft, hop)
+            flux_total = received // hop
+            energy_total = max(0, (received - len(plan.web_window)) // hop + 1)
+        else:
+            # Only whole blocks before the end, as the one-shot functions
+            # would compute them
+            stft_total = self._whole_blocks(self._available(n_fft - n_fft // 2))
+            flux_total = self._whole_blocks(self._available(plan.flux_frame_size))
+            energy_total = self._whole_blocks(self._available(len(plan.web_window)))
+
+        offset = self._tail_start
+        while self._stft_frames < stft_total:
+            count = min(BLOCK_FRAMES, stft_total - self._stft_frames)
+            self._bands.append(stft_block(self._tail, self._stft_frames, count,
+                                          self._scaled_window, hop, plan.band_weights,
+                                          self.workers, offset))
+            self._stft_frames += count
+
+        # Like spectral_flux, no flux at all for fewer than two frames
+        while flux_total >= 2 and self._flux_frames < flux_total:
+            count = min(BLOCK_FRAMES, flux_total - self._flux_frames)
+            spec = flux_spectra(self._tail, self._flux_frames, count, plan.flux_frame_size,
+                                hop, n_fft, self.workers, offset)
+            self._flux.append(positive_flux(self._previous_spectrum, spec))
+            self._previous_spectrum = spec[-1:]
+            self._flux_frames += count
+
+        while self._energy_frames < energy_total:
+            count = min(BLOCK_FRAMES, energy_total - self._energy_frames)
+            start = self._energy_frames * hop - offset
+            segment = self._tail[start:start + (count - 1) * hop + len(plan.web_window)]
+            self._energies.append(frame_energies(segment, plan.web_window, hop))
+            self._energy_frames += count
+
+        # Drop samples that no pending frame reads
+        keep_from = max(self._tail_start, min(self._stft_frames * hop - n_fft // 2,
+                                              self._flux_frames * hop,
+                                              self._energy_frames * hop))
+        self._tail = self._tail[keep_from - self._tail_start:]
+        self._tail_start = keep_from
+
+    @staticmethod
+    def _whole_blocks(frames):
+        return frames // BLOCK_FRAMES * BLOCK_FRAMES
+
+    def ready(self):
+        """Whether a snapshot has enough frames for every intermediate"""
+        return self._finished or min(self._stft_frames, self._flux_frames,
+                                     self._energy_frames) >= BLOCK_FRAMES
+
+    def snapshot(self) -> AudioFeatures:
+        """
+        Features of the audio processed so far. After finish() they equal
+        AudioFeatures of the whole track.
+        """
+        peak = self.peak or 1.0
+        bands = np.concatenate(self._bands, axis=1)
+        intermediates = {
+            ONSET_ENVELOPE: onset_from_bands(bands / peak, self.plan),
+            SPECTRAL_FLUX: np.concatenate(self._flux) if self._flux else np.zeros(0),
+            FRAME_ENERGIES: (np.concatenate(self._energies) if self._energies
+                             else np.zeros(0)) / peak ** 2,
+        }
+        loader = (lambda: np.concatenate(self._chunks)) if self.keep_audio else None
+        return AudioFeatures(None, self.sample_rate, self.plan, self.workers, loader=loader,
+                             intermediates=intermediates)
@@ -0,0 +1,157 @@
+"""
+Registry of BPM detection algorithms, resolved lazily on first use
+
+This module must stay free of numpy/scipy imports so that listing the
+algorithms (e.g. for ``bpm-detector --help``) does not pay their import cost.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from importlib import import_module
+from typing import Callable, List, Tuple, Union
+
+class BPMAlgorithm(Enum):
+    AUTOCORRELATION = "autocorrelation"
+    ENERGY_FLUX = "energy flux"
+    WEB_STYLE = "web style"
+
+# Shared intermediates an algorithm can declare (see bpm_detector.features)
+ONSET_ENVELOPE = "onset_envelope"  # Band-reduced onset strength, one value per hop
+SPECTRAL_FLUX = "spectral_flux"  # Positive spectral flux of the raw signal
+FRAME_ENERGIES = "frame_energies"  # Hann-windowed energy of each frame
+
+@dataclass(frozen=True)
+class AlgorithmSpec:
+    """
+    A registered algorithm and what a scheduler needs to know about it.
+
+    The estimator is called as estimate(features, min_bpm, max_bpm) with an
+    AudioFeatures instance and returns a BPM, or 0 when none was found.
+    """
+    key: Union[BPMAlgorithm, str]  # BPMAlgorithm member for built-ins, name for plugins
+    name: str
+    estimator: Union[str, Callable]  # Callable, or "module:function" imported on first use
+    needs: Tuple[str, ...] = ()  # Shared intermediates read from AudioFeatures
+    cost: float = 1.0  # Relative cost of the estimator itself, excluding intermediates
+    streaming: bool = False  # Works from intermediates that can be built chunk by chunk
+    batching: bool = False  # Can estimate several tracks in one call
+
+# Relative cost of computing each shared intermediate once
+INTERMEDIATE_COSTS = {
+    ONSET_ENVELOPE: 1.0,
+    SPECTRAL_FLUX: 1.0,
+    FRAME_ENERGIES: 0.2,
+}
+
+_specs = {}
+_resolved = {}
+
+def register_algorithm(name, estimator, needs=(), cost=1.0, streaming=False, batching=False,
+                       key=None):
+    """
+    Register a BPM detection algorithm.
+
+    Args:
+        name (str): Display name, also used as the key unless `key` is given
+        estimator (callable or str): estimate(features, min_bpm, max_bpm), or
+            a "module:function" string resolved the first time it runs
+        needs (Tuple[str, ...]): Shared intermediates the estimator reads
+        cost (float): Relative cost of the estimator itself
+        streaming (bool): Whether its intermediates can be built incrementally
+        batching (bool): Whether it can estimate several tracks in one call
+        key: Key used in result dictionaries
+
+    Returns:
+        AlgorithmSpec: The registered specification
+    """
+    for need in needs:
+        if need not in INTERMEDIATE_COSTS:
+            raise ValueError(f"Unknown intermediate: {need}")
+    spec = AlgorithmSpec(key=name if key is None else key, name=name, estimator=estimator,
+                         needs=tuple(needs), cost=cost, streaming=streaming, batching=batching)
+    _specs[spec.key] = spec
+    _resolved.pop(spec.key, None)
+    return spec
+
+def unregister_algorithm(key):
+    """Remove a registered algorithm"""
+    _specs.pop(get_spec(key).key)
+
+def get_spec(key):
+    """Look up an algorithm by key or display name"""
+    if key in _specs:
+        return _specs[key]
+    for spec in _specs.values():
+        if spec.name == key:
+            return spec
+    raise ValueError(f"Unknown algorithm: {key}")
+
+def total_cost(spec, shared=()):
+    """Cost of running an algorithm when the intermediates in `shared` already exist"""
+    return spec.cost + sum(INTERMEDIATE_COSTS[need] for need in spec.needs if need not in shared)
+
+def available_algorithms(keys=None) -> List[AlgorithmSpec]:
+    """
+    Registered algorithms in registration order.
+
+    Args:
+        keys: Optional subset of keys or names to include
+
+    Returns:
+        List[AlgorithmSpec]: Matching specs, see schedule_algorithms for run order
+    """
+    if keys is None:
+        return list(_specs.values())
+    return [get_spec(key) for key in keys]
+
+def schedule_algorithms(specs) -> List[AlgorithmSpec]:
+    """
+    Order algorithms so each step adds the least cost given the intermediates
+    computed by the steps before it.
+    """
+    pending = list(specs)
+    shared = set()
+    order = []
+    while pending:
+        spec = min(pending, key=lambda s: total_cost(s, shared))
+        pending.remove(spec)
+        shared.update(spec.needs)
+        order.append(spec)
+    return order
+
+def algorithm_names():
+    """Names of all registered algorithms, without importing any of them"""
+    return [spec.name for spec in available_algorithms()]
+
+def get_algorithm(algorithm):
+    """
+    Return the estimator for an algorithm, importing it on first use.
+
+    Args:
+        algorithm: Key or name of a registered algorithm
+
+    Returns:
+        callable: estimate(features, min_bpm, max_bpm)
+    """
+    spec = get_spec(algorithm)
+    func = _resolved.get(spec.key)
+    if func is None:
+        func = spec.estimator
+        if isinstance(func, str):
+            module_name, func_name = func.split(':')
+            func = getattr(import_module(module_name), func_name)
+        _resolved[spec.key] = func
+    return func
+
+register_algorithm(BPMAlgorithm.AUTOCORRELATION.value,
+                   "bpm_detector.detector:estimate_autocorrelation",
+                   needs=(ONSET_ENVELOPE,), cost=0.1, streaming=True,
+                   key=BPMAlgorithm.AUTOCORRELATION)
+register_algorithm(BPMAlgorithm.ENERGY_FLUX.value,
+                   "bpm_detector.detector:estimate_energy_flux",
+                   needs=(SPECTRAL_FLUX,), cost=0.05, streaming=True,
+                   key=BPMAlgorithm.ENERGY_FLUX)
+register_algorithm(BPMAlgorithm.WEB_STYLE.value,
+                   "bpm_detector.detector:estimate_web_style",
+                   needs=(FRAME_ENERGIES,), cost=0.1, streaming=True,
+                   key=BPMAlgorithm.WEB_STYLE)
@@ -0,0 +1,397 @@
+"""
+Local HTTP analysis service with warm workers and request batching
+
+Endpoints:
+    POST /analyze        {"path": "/music/track.flac"}
+    POST /analyze/pcm    raw little-endian float32 samples, interleaved;
+                         query parameters sample_rate and channels
+    GET  /stats          queue depth, cache and latency statistics
+    GET  /metrics        the same and more in Prometheus text format
+    GET  /health
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from .batch import results_to_dict
+from .detector import BPMDetector
+from .metrics import (CACHE_REQUESTS, QUEUE_DEPTH, REQUEST_SECONDS, MetricsRegistry,
+                      record_analysis)
+from .shm import SharedMemoryPool, attach
+
+_worker_detector = None
+
+def _init_worker(detector):
+    global _worker_detector
+    _worker_detector = detector
+
+def _analyze_items(detector, items):
+    """
+    Run one batch. Each outcome is (True, results, record) or (False, error
+    message, record), where record holds the timings for metrics
+    """
+    outcomes = []
+    for kind, payload in items:
+        start = time.perf_counter()
+        timings = {}
+        try:
+            if kind == "file":
+                results = detector.detect_file(payload, timings)
+            elif kind == "shared":
+                handle, sample_rate = payload
+                with attach(handle) as audio_data:
+                    results = detector.detect_all(audio_data, sample_rate, timings)
+            else:
+                audio_data, sample_rate = payload
+                results = detector.detect_all(audio_data, sample_rate, timings)
+            outcomes.append((True, results, {"status": "ok", "timings": timings,
+                                             "elapsed": time.perf_counter() - start}))
+        except Exception as e:
+            outcomes.append((False, f"{type(e).__name__}: {e}",
+                             {"status": "error", "error_type": type(e).__name__}))
+    return outcomes
+
+def _analyze_in_worker(items):
+    return _analyze_items(_worker_detector, items)
+
+class _Request:
+    __slots__ = ("key", "kind", "payload", "future", "submitted")
+
+    def __init__(self, key, kind, payload):
+        self.key = key
+        self.kind = kind
+        self.payload = payload
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+class AnalysisService:
+    """
+    Keeps warm detector workers and feeds them batches of requests.
+
+    A batch is formed whenever a worker is free: it takes everything queued
+    (up to max_batch), waiting at most max_wait seconds for more to arrive.
+    Under load requests therefore coalesce into larger batches. Identical
+    requests in flight share one analysis, and results are cached by file
+    identity (path, size, mtime) or PCM content hash.
+
+    With worker processes, submitted PCM is handed over in shared memory
+    (see bpm_detector.shm) rather than pickled, and released once its batch
+    completes or fails. If a worker process dies, the pool is replaced when
+    the next batch is dispatched.
+
+    Files, errors, timings, cache use and queue depth are recorded in
+    `metrics` (a MetricsRegistry, created if not given).
+    """
+
+    def __init__(self, detector=None, workers=2, max_batch=8, max_wait=0.005,
+                 cache_size=4096, use_processes=False, latency_window=10000, metrics=None):
+        self.detector = detector or BPMDetector()
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.use_processes = use_processes
+        self._queue = queue.Queue()
+        self._free_workers = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._latencies = deque(maxlen=latency_window)
+        self._counts = {"requests": 0, "cache_hits": 0, "errors": 0, "batches": 0,
+                        "batched_requests": 0, "in_flight": 0}
+        self._executor = None
+        self._batcher = None
+        self._shared = None
+        self._stopped = False
+        self.metrics = metrics or MetricsRegistry()
+        self.metrics.gauge(QUEUE_DEPTH, "Requests or files waiting for a worker") \
+            .set_function(self._queue.qsize)
+        self._cache_requests = self.metrics.counter(
+            CACHE_REQUESTS, "Cache lookups, by cache and result")
+        self._request_seconds = self.metrics.histogram(
+            REQUEST_SECONDS, "Seconds from submitting a request to its result")
+
+    def start(self):
+        if self.use_processes:
+            self._shared = SharedMemoryPool()
+            self._executor = self._process_pool()
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        with self._lock:
+            self._stopped = False
+        self._batcher = threading.Thread(target=self._run_batcher, daemon=True)
+        self._batcher.start()
+        return self
+
+    def _process_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.detector,))
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True  # Later submissions fail right away
+        if self._batcher is not None:
+            self._queue.put(None)
+            self._batcher.join()
+            self._batcher = None
+        self._fail_queued()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+    def _fail_queued(self):
+        """Fail requests that were queued behind the stop sentinel"""
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is None:
+                continue
+            with self._lock:
+                self._inflight.pop(request.key, None)
+            request.future.set_exception(RuntimeError("Service stopped"))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit_file(self, path) -> Future:
+        """Analyse an audio file; the future resolves to detect_all results"""
+        st = os.stat(path)
+        key = ("file", os.path.realpath(path), st.st_size, st.st_mtime_ns)
+        return self._submit(key, "file", path)
+
+    def submit_pcm(self, audio_data, sample_rate) -> Future:
+        """Analyse decoded samples (frames, or frames x channels)"""
+        audio_data = np.ascontiguousarray(audio_data)
+        key = ("pcm", hashlib.sha1(audio_data.view(np.uint8)).hexdigest(),
+               audio_data.shape, sample_rate)
+        return self._submit(key, "pcm", (audio_data, sample_rate))
+
+    def _submit(self, key, kind, payload):
+        with self._lock:
+            if self._stopped:
+                future = Future()
+                future.set_exception(RuntimeError("Service stopped"))
+                return future
+            self._counts["requests"] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._counts["cache_hits"] += 1
+                self._cache_requests.inc(cache="results", result="hit")
+                future = Future()
+                future.set_result(self._cache[key])
+                self._latencies.append(0.0)
+                return future
+            if key in self._inflight:
+                # Shares the analysis already running for the same input
+                self._cache_requests.inc(cache="results", result="coalesced")
+                return self._inflight[key].future
+            self._cache_requests.inc(cache="results", result="miss")
+            request = _Request(key, kind, payload)
+            self._inflight[key] = request
+            # Under the lock, so that stop() queues its sentinel behind it
+            self._queue.put(request)
+        return request.future
+
+    def _run_batcher(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            self._free_workers.acquire()
+            batch = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        with self._lock:
+            self._counts["batches"] += 1
+            self._counts["batched_requests"] += len(batch)
+            self._counts["in_flight"] += len(batch)
+        items = [(request.kind, request.payload) for request in batch]
+        shared = []
+        try:
+            if self.use_processes:
+                for kind, payload in items:
+                    shared.append(self._share(kind, payload))
+                future = self._submit_to_pool(shared)
+                future.add_done_callback(lambda f: self._unshare(shared))
+            else:
+                future = self._executor.submit(_analyze_items, self.detector, items)
+        except Exception as e:  # Out of shared memory, or no usable pool
+            self._unshare(shared)
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda f: self._complete(batch, f))
+
+    def _submit_to_pool(self, items):
+        try:
+            return self._executor.submit(_analyze_in_worker, items)
+        except BrokenProcessPool:
+            # A worker died; the batch that was running on it has failed
+            # already, so replace the pool for this one and the next
+            self._executor.shutdown(wait=False)
+            self._executor = self._process_pool()
+            return self._executor.submit(_analyze_in_worker, items)
+
+    def _share(self, kind, payload):
+        if kind != "pcm":
+            return kind, payload
+        audio_data, sample_rate = payload
+        return "shared", (self._shared.publish(audio_data), sample_rate)
+
+    def _unshare(self, items):
+        for kind, payload in items:
+            if kind == "shared":
+                self._shared.release(payload[0])
+
+    def _complete(self, batch, batch_future):
+        self._free_workers.release()
+        try:
+            outcomes = batch_future.result()
+        except Exception as e:  # Worker process died, or the batch was never submitted
+            outcomes = [(False, f"{type(e).__name__}: {e}",
+                         {"status": "error", "error_type": type(e).__name__})] * len(batch)
+        now = time.perf_counter()
+        for request, (_, _, record) in zip(batch, outcomes):
+            record_analysis(self.metrics, record)
+            self._request_seconds.observe(now - request.submitted)
+        with self._lock:
+            self._counts["in_flight"] -= len(batch)
+            for request, (ok, value, _) in zip(batch, outcomes):
+                del self._inflight[request.key]
+                self._latencies.append(now - request.submitted)
+                if ok:
+                    self._cache[request.key] = value
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                else:
+                    self._counts["errors"] += 1
+        for request, (ok, value, _) in zip(batch, outcomes):
+            if ok:
+                request.future.set_result(value)
+            else:
+                request.future.set_exception(RuntimeError(value))
+
+    def stats(self) -> dict:
+        """Counters, queue depth and latency percentiles in milliseconds"""
+        with self._lock:
+            stats = dict(self._counts)
+            latencies = np.array(self._latencies)
+            stats["cached_results"] = len(self._cache)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["mean_batch_size"] = (stats["batched_requests"] / stats["batches"]
+                                    if stats["batches"] else 0.0)
+        for p in (50, 90, 99):
+            stats[f"latency_p{p}_ms"] = (float(np.percentile(latencies, p)) * 1000
+                                         if len(latencies) else None)
+        return stats
+
+def _make_handler(service, request_timeout):
+    class AnalysisHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/stats":
+                self._send_json(200, service.stats())
+            elif path == "/metrics":
+                data = service.metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif path == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                if url.path == "/analyze":
+                    request = json.loads(body)
+                    if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+                        raise ValueError('Expected a JSON object with a "path" string')
+                    future = service.submit_file(request["path"])
+                elif url.path == "/analyze/pcm":
+                    query = parse_qs(url.query)
+                    sample_rate = int(query["sample_rate"][0])
+                    channels = int(query.get("channels", ["1"])[0])
+                    audio_data = np.frombuffer(body, dtype="<f4").astype(np.float64)
+                    if channels > 1:
+                        audio_data = audio_data.reshape(-1, channels)
+                    future = service.submit_pcm(audio_data, sample_rate)
+                else:
+                    self._send_json(404, {"error": "not found"})
+                    return
+            except (KeyError, ValueError, OSError) as e:
+                self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+                return
+            try:
+                self._send_json(200, {"results": results_to_dict(
+                    future.result(timeout=request_timeout))})
+            except FutureTimeoutError:
+                self._send_json(504, {"error": f"No result within {request_timeout} s"})
+            except RuntimeError as e:
+                self._send_json(422, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass  # Keep request logging out of stderr
+
+    return AnalysisHandler
+
+def create_server(service, host="127.0.0.1", port=0,
+                  request_timeout=300.0) -> ThreadingHTTPServer:
+    """
+    HTTP server for a started service; port 0 picks a free port. Requests
+    without a result after request_timeout seconds get a 504
+    """
+    return ThreadingHTTPServer((host, port), _make_handler(service, request_timeout))
+
+def serve(host="127.0.0.1", port=8765, **service_options):
+    """Run the service until interrupted"""
+    with AnalysisService(**service_options) as service:
+        server = create_server(service, host, port)
+        print(f"BPM analysis service listening on http://{host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,198 @@
+"""
+Splitting batch analysis across nodes that share a filesystem
+
+Two modes are supported:
+
+- Static shards: every node gets the files whose path hashes to its shard
+  index (select_shard), with no coordination at all.
+- Work stealing: every node walks the full file list and claims files through
+  lock files in a shared directory (LockDirectoryClaimer), so fast nodes
+  take more work.
+
+Each node writes its own manifest; merge_manifests combines them.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List
+from .batch import STATUS_OK, read_manifest
+
+def shard_for_path(path, num_shards) -> int:
+    """Stable shard index of a path, identical on every node and Python run"""
+    digest = hashlib.md5(os.path.normpath(path).encode("utf-8")).hexdigest()
+    return int(digest, 16) % num_shards
+
+def select_shard(files, shard_index, num_shards) -> List[str]:
+    """Files belonging to one shard"""
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"Invalid shard {shard_index} of {num_shards}")
+    return [path for path in files if shard_for_path(path, num_shards) == shard_index]
+
+class LockDirectoryClaimer:
+    """
+    Claims files through lock files created with O_EXCL in a shared directory.
+
+    A claim is held as <digest>.lock containing the owning node id and is
+    renamed to <digest>.done once the file is finished, so no other node
+    picks it up. Claims older than `stale_after` seconds that never finished
+    (e.g. the node crashed) may be taken over by another node. While a file
+    is being analysed, a background thread touches its lock every
+    `heartbeat` seconds, so only claims of dead nodes go stale; `heartbeat`
+    should be well below the other nodes' `stale_after`.
+
+    The node id defaults to the host name, so a restarted node picks up its
+    own unfinished claims. Give each run its own id when several runs on
+    one host share the lock directory.
+    """
+
+    def __init__(self, lock_dir, node_id=None, stale_after=None, heartbeat=30.0):
+        self.lock_dir = lock_dir
+        self.node_id = node_id or socket.gethostname()
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        self._held = set()  # Lock paths claimed and not yet completed
+        self._lock = threading.Lock()
+        self._thread = None
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _paths(self, path):
+        digest = hashlib.sha1(os.path.normpath(path).encode("utf-8")).hexdigest()
+        base = os.path.join(self.lock_dir, digest)
+        return base + ".lock", base + ".done"
+
+    def claim(self, path) -> bool:
+        """Try to take ownership of a file; True if this node should process it"""
+        lock, done = self._paths(path)
+        if os.path.exists(done):
+            return False
+        try:
+            fd = os.open(lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return self._owned_or_stolen(path, lock)
+        try:
+            os.write(fd, json.dumps({"node": self.node_id, "path": path,
+                                     "time": time.time()}).encode("utf-8"))
+        finally:
+            os.close(fd)
+        if os.path.exists(done):
+            # Another node finished it between our check and the lock creation
+            os.remove(lock)
+            return False
+        self._hold(lock)
+        return True
+
+    def _owner(self, lock):
+        """Node id in a lock file; raises FileNotFoundError or ValueError"""
+        with open(lock, "rb") as f:
+            return json.loads(f.read() or b"{}").get("node")
+
+    def _owned_or_stolen(self, path, lock):
+        try:
+            owner = self._owner(lock)
+            mtime = os.stat(lock).st_mtime_ns
+        except (FileNotFoundError, ValueError):
+            return False  # Being finished or still being written by its owner
+        if owner == self.node_id:
+            self._hold(lock)
+            return True  # Our own claim from before a restart
+        if self.stale_after is None or time.time() - mtime / 1e9 < self.stale_after:
+            return False
+        # Only one node can win the rename of a stale lock
+        stale = f"{lock}.stale-{self.node_id}"
+        try:
+            os.rename(lock, stale)
+        except FileNotFoundError:
+            return False
+        try:
+            taken = (self._owner(stale), os.stat(stale).st_mtime_ns) == (owner, mtime)
+        except ValueError:
+            taken = False
+        if not taken:
+            # Another node took the lock over between our check and the
+            # rename, and we moved its live claim: put it back, unless yet
+            # another claim has appeared there meanwhile
+            try:
+                os.link(stale, lock)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        return self.claim(path)
+
+    def _hold(self, lock):
+        with self._lock:
+            self._held.add(lock)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._beat, daemon=True)
+                self._thread.start()
+
+    def _beat(self):
+        """Refresh held locks until none are left"""
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                held = list(self._held)
+                if not held:
+                    self._thread = None
+                    return
+            for lock in held:
+                try:
+                    if self._owner(lock) == self.node_id:
+                        os.utime(lock)
+                        continue
+                except (FileNotFoundError, ValueError):
+                    pass
+                with self._lock:
+                    self._held.discard(lock)  # Taken over by another node
+
+    def complete(self, path):
+        """
+        Mark a claimed file as finished. Does nothing if the claim was taken
+        over by another node meanwhile, which then completes it itself.
+        """
+        lock, done = self._paths(path)
+        with self._lock:
+            self._held.discard(lock)
+        try:
+            if self._owner(lock) != self.node_id:
+                return
+            os.replace(lock, done)
+        except (FileNotFoundError, ValueError):
+            pass
+
+def merge_manifests(manifest_paths, output_path) -> Dict[str, int]:
+    """
+    Combine per-node manifests into one, keeping the final outcome per file.
+
+    A successful record wins over failures. The output is written to a
+    temporary file and moved into place, so readers never see a partial merge.
+
+    Returns:
+        Dict[str, int]: Counts of "files", "ok", "failed" and "duplicates"
+        (files with a successful record on more than one node)
+    """
+    final = {}
+    ok_nodes = {}
+    for index, manifest_path in enumerate(manifest_paths):
+        for record in read_manifest(manifest_path):
+            path = record["path"]
+            if record["status"] == STATUS_OK:
+                ok_nodes.setdefault(path, set()).add(index)
+                final[path] = record
+            elif final.get(path, {}).get("status") != STATUS_OK:
+                final[path] = record
+
+    tmp_path = f"{output_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for path in sorted(final):
+            f.write(json.dumps(final[path], sort_keys=True) + "\n")
+    os.replace(tmp_path, output_path)
+
+    ok = sum(1 for record in final.values() if record["status"] == STATUS_OK)
+    return {"files": len(final), "ok": ok, "failed": len(final) - ok,
+            "duplicates": sum(1 for nodes in ok_nodes.values() if len(nodes) > 1)}
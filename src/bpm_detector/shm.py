@@ -0,0 +1,241 @@
+"""
+Zero-copy handoff of decoded audio and intermediates between processes
+
+A publishing process copies (or decodes) an array into a shared memory
+segment once and passes a small SharedArray handle instead of pickling the
+samples. Workers attach to the handle and read a numpy view of the same
+memory. The publisher counts references per segment and unlinks it when
+the last one is released.
+
+Cleanup on crashes: segments are registered with multiprocessing's
+resource tracker, which unlinks them if the publisher dies without doing
+so. Segment names carry the publisher's PID namespace and PID, so
+remove_orphans can also reclaim segments of a publisher that was killed
+together with its tracker, without touching segments of processes in other
+containers sharing /dev/shm.
+"""
+
+import itertools
+import mmap
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+import numpy as np
+
+PREFIX = "bpmdet"
+
+# Linux exposes POSIX shared memory as files here; elsewhere orphan scanning
+# is not available
+_SHM_DIR = "/dev/shm"
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Picklable handle of an array in shared memory"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+def _namespace():
+    """Short id of this process's PID namespace, "0" where unknown"""
+    try:
+        # e.g. "pid:[4026531836]"
+        return format(int(os.readlink("/proc/self/ns/pid")[5:-1]), "x")
+    except (OSError, ValueError):
+        return "0"
+
+_NAMESPACE = _namespace()
+
+def _map(handle):
+    """(buffer, close) of a read-only mapping of the segment"""
+    # Attaching with SharedMemory registers the segment with this process's
+    # resource tracker, which unlinks it when this process exits even though
+    # the publisher still owns it. Python 3.13 can opt out of tracking
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=handle.name, track=False)
+        return shm.buf, shm.close
+    try:
+        # Before 3.13 the only way to open a segment untracked (and
+        # read-only) is the private POSIX module behind SharedMemory, which
+        # exists wherever SharedMemory uses a resource tracker
+        import _posixshmem
+    except ImportError:
+        # Windows: no resource tracker, SharedMemory is safe to attach
+        shm = shared_memory.SharedMemory(name=handle.name)
+        return shm.buf, shm.close
+    fd = _posixshmem.shm_open("/" + handle.name, os.O_RDONLY, mode=0o600)
+    try:
+        mapping = mmap.mmap(fd, max(1, handle.nbytes), prot=mmap.PROT_READ)
+    finally:
+        os.close(fd)
+    return mapping, mapping.close
+
+@contextmanager
+def attach(handle):
+    """
+    Read-only numpy view of a published array, valid inside the block.
+
+    Raises FileNotFoundError if the segment was already released.
+    """
+    buffer, close = _map(handle)
+    view = None
+    try:
+        view = np.ndarray(handle.shape, dtype=handle.dtype, buffer=buffer)
+        view.flags.writeable = False
+        yield view
+    finally:
+        del view
+        try:
+            close()
+        except BufferError:
+            pass  # A caller kept a view; the mapping goes when it is collected
+
+class SharedMemoryPool:
+    """
+    Publishes arrays to shared memory and owns the segments.
+
+    Every publish or acquire adds a reference, every release removes one,
+    and the segment is unlinked when none are left. close() unlinks all
+    remaining segments. The pool is thread-safe.
+    """
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def allocate(self, shape, dtype=np.float64):
+        """
+        Create a segment with one reference.
+
+        Returns:
+            Tuple[SharedArray, numpy.ndarray]: Handle and a writable view
+            to fill, e.g. by decoding straight into it
+        """
+        # The namespace keeps names unique across containers sharing /dev/shm
+        handle = SharedArray(f"{self.prefix}{_NAMESPACE}_{os.getpid()}_{next(self._counter)}",
+                             tuple(int(n) for n in shape), np.dtype(dtype).str)
+        # Zero-size segments are not allowed
+        shm = shared_memory.SharedMemory(name=handle.name, create=True,
+                                         size=max(1, handle.nbytes))
+        with self._lock:
+            self._segments[handle.name] = shm
+            self._refcounts[handle.name] = 1
+        return handle, np.ndarray(handle.shape, dtype=handle.dtype, buffer=shm.buf)
+
+    def publish(self, array) -> SharedArray:
+        """Copy an array into a new segment with one reference"""
+        array = np.asarray(array)
+        handle, view = self.allocate(array.shape, array.dtype)
+        view[...] = array
+        return handle
+
+    def acquire(self, handle):
+        """Add a reference, e.g. for each job the handle is passed to"""
+        with self._lock:
+            if handle.name not in self._refcounts:
+                raise KeyError(f"Segment already released: {handle.name}")
+            self._refcounts[handle.name] += 1
+
+    def release(self, handle):
+        """Drop a reference, unlinking the segment with the last one"""
+        with self._lock:
+            self._refcounts[handle.name] -= 1
+            if self._refcounts[handle.name] > 0:
+                return
+            del self._refcounts[handle.name]
+            shm = self._segments.pop(handle.name)
+        _unlink(shm)
+
+    @property
+    def active(self):
+        """Number of live segments"""
+        with self._lock:
+            return len(self._segments)
+
+    def close(self):
+        """Unlink every segment regardless of references"""
+        with self._lock:
+            segments = list(self._segments.values())
+            self._segments.clear()
+            self._refcounts.clear()
+        for shm in segments:
+            _unlink(shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _unlink(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # The publisher's own view is still referenced somewhere
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+def read_shared(pool, file_path):
+    """
+    Decode an audio file straight into a new shared segment.
+
+    Returns:
+        Tuple[SharedArray, int]: Handle of the (frames, channels) float64
+        samples, and the sample rate
+    """
+    import soundfile as sf
+
+    with sf.SoundFile(file_path) as f:
+        handle, view = pool.allocate((f.frames, f.channels))
+        try:
+            f.read(out=view)
+        except Exception:
+            pool.release(handle)
+            raise
+        return handle, f.samplerate
+
+def remove_orphans(prefix=PREFIX):
+    """
+    Unlink segments left by publishers that are no longer running.
+
+    Only segments published from this PID namespace are considered, since
+    the PIDs of other namespaces (containers) cannot be checked from here.
+
+    Returns:
+        List[str]: Names of the removed segments
+    """
+    if not os.path.isdir(_SHM_DIR) or _NAMESPACE == "0":
+        return []
+    own = f"{prefix}{_NAMESPACE}_"
+    removed = []
+    for name in os.listdir(_SHM_DIR):
+        pid = name[len(own):].split("_", 1)[0]
+        if not name.startswith(own) or not pid.isdigit() or _alive(int(pid)):
+            continue
+        try:
+            os.unlink(os.path.join(_SHM_DIR, name))
+            removed.append(name)
+        except OSError:
+            pass
+    return removed
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by someone else
+    return True
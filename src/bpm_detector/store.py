@@ -0,0 +1,67 @@
+"""
+Sidecar store of compact intermediates, so later runs can skip decoding
+"""
+
+import hashlib
+import os
+from typing import Dict
+import numpy as np
+from .registry import ONSET_ENVELOPE, SPECTRAL_FLUX, FRAME_ENERGIES
+
+# Bump when the computation of a stored intermediate changes, so old
+# sidecars are ignored instead of silently reused
+STORE_VERSION = 1
+
+# One value per hop, a few KB per track
+STORABLE = (ONSET_ENVELOPE, SPECTRAL_FLUX, FRAME_ENERGIES)
+
+def content_hash(file_path, chunk_size=1 << 20) -> str:
+    """SHA-1 of the file contents; renamed or copied files share it"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _front_end(plan):
+    # Everything the stored intermediates depend on; the tempo range is not
+    return (f"v{STORE_VERSION}-sr{plan.sample_rate}-hop{plan.hop_length}"
+            f"-fft{plan.n_fft}-bands{plan.n_bands}")
+
+class EnvelopeStore:
+    """
+    Compressed .npz sidecars in a cache directory.
+
+    Each file holds the intermediates of one track (by content hash) for one
+    front end (sample rate, hop, FFT size, bands). Entries are independent of
+    the tempo range, peak picking and the algorithms reading them.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def path_for(self, digest, plan):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{_front_end(plan)}.npz")
+
+    def load(self, digest, plan) -> Dict[str, np.ndarray]:
+        """Stored intermediates, empty if there are none or they are unreadable"""
+        path = self.path_for(digest, plan)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["store_version"]) != STORE_VERSION:
+                    return {}
+                return {name: data[name] for name in STORABLE if name in data}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def save(self, digest, plan, intermediates):
+        """Write the storable intermediates, replacing an existing sidecar atomically"""
+        arrays = {name: np.asarray(value) for name, value in intermediates.items()
+                  if name in STORABLE}
+        if not arrays:
+            return
+        path = self.path_for(digest, plan)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez_compressed(tmp_path, store_version=STORE_VERSION, **arrays)
+        os.replace(tmp_path, path)
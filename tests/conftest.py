@@ -0,0 +1,30 @@
+"""Fixtures shared by the test modules"""
+
+import numpy as np
+import pytest
+from signals import make_click_track
+
+@pytest.fixture
+def click_track():
+    """make_click_track(bpm, duration, sample_rate, seed=0)"""
+    return make_click_track
+
+@pytest.fixture
+def write_tracks(tmp_path):
+    """
+    write_tracks(count, sample_rate=22050) writes `count` WAV files of the
+    same 4 s click track at 120 BPM to tmp_path and returns their paths
+    """
+    sf = pytest.importorskip("soundfile")
+
+    def write(count, sample_rate=22050):
+        track = make_click_track(120, 4, sample_rate)
+        track = 0.9 * track / np.max(np.abs(track))  # Fits 16-bit WAV without clipping
+        paths = []
+        for i in range(count):
+            path = str(tmp_path / f"track{i}.wav")
+            sf.write(path, track, sample_rate)
+            paths.append(path)
+        return paths
+
+    return write
@@ -0,0 +1,14 @@
+"""Synthetic test signals, shared by the test suite and the benchmarks"""
+
+import numpy as np
+
+def make_click_track(bpm, duration, sample_rate, seed=0):
+    """Decaying noise bursts on every beat, over a quiet noise floor"""
+    rng = np.random.default_rng(seed)
+    burst_len = int(0.03 * sample_rate)
+    burst = rng.standard_normal(burst_len) * np.exp(-np.arange(burst_len) / (0.005 * sample_rate))
+    track = 0.01 * rng.standard_normal(int(duration * sample_rate))
+    for beat in np.arange(0, duration - 0.05, 60.0 / bpm):
+        start = int(beat * sample_rate)
+        track[start:start + burst_len] += burst
+    return track
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bpm_detector.detector import BPMAlgorithm, BPMDetector
+
+def test_detect_all_async_matches_sync(tmp_path, write_tracks):
+    path = write_tracks(1)[0]
+    detector = BPMDetector()
+    assert asyncio.run(detector.detect_all_async(path)) == detector.detect_file(path)
+
+def test_detect_files_async_streams_with_bounded_concurrency(tmp_path, write_tracks):
+    paths = write_tracks(4) + [str(tmp_path / "missing.wav")]
+    active = []
+    peak = []
+
+    class TrackingDetector(BPMDetector):
+        def detect_file(self, file_path):
+            active.append(file_path)
+            peak.append(len(active))
+            try:
+                time.sleep(0.05)
+                return super().detect_file(file_path)
+            finally:
+                active.remove(file_path)
+
+    async def collect():
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            return [item async for item in TrackingDetector().detect_files_async(
+                paths, executor, max_concurrency=2)]
+
+    results = dict(asyncio.run(collect()))
+    assert sorted(results) == sorted(paths)
+    assert max(peak) <= 2
+    assert isinstance(results[paths[-1]], Exception)
+    assert BPMAlgorithm.AUTOCORRELATION in results[paths[0]]
+
+def test_detect_files_async_cancels_queued_work(tmp_path, write_tracks):
+    paths = write_tracks(1) * 20
+    started = []
+
+    class SlowDetector(BPMDetector):
+        def detect_file(self, file_path):
+            started.append(file_path)
+            time.sleep(0.05)
+            return {}
+
+    async def first_only():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            async for item in SlowDetector().detect_files_async(paths, executor,
+                                                                max_concurrency=4):
+                return item
+
+    asyncio.run(first_only())
+    assert len(started) < len(paths)
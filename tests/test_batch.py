@@ -0,0 +1,106 @@
+import json
+import pytest
+import numpy as np
+from bpm_detector.batch import BatchJob, read_manifest, results_from_dict
+from bpm_detector.detector import BPMAlgorithm
+
+sf = pytest.importorskip("soundfile")
+
+def test_batch_resumes_and_limits_retries(tmp_path, write_tracks):
+    paths = write_tracks(3)
+    broken = tmp_path / "broken.wav"
+    broken.write_bytes(b"not audio")
+    paths.append(str(broken))
+    manifest = str(tmp_path / "run.jsonl")
+
+    seen = []
+    progress = BatchJob(paths, manifest, max_retries=1).run(lambda record, p: seen.append(p))
+    assert progress.completed == 3
+    assert progress.failed == 1
+    assert progress.remaining == 0
+    assert seen[-1].eta_seconds == 0
+    records = list(read_manifest(manifest))
+    assert [r["path"] for r in records].count(str(broken)) == 2  # First try plus one retry
+    ok = [r for r in records if r["status"] == "ok"][0]
+    assert BPMAlgorithm.AUTOCORRELATION in results_from_dict(ok["results"])
+
+    # A restart has nothing left to do
+    job = BatchJob(paths, manifest, max_retries=1)
+    assert job.pending() == []
+    assert job.run().completed == 3
+    assert len(list(read_manifest(manifest))) == len(records)
+
+def test_batch_recovers_from_truncated_manifest(tmp_path, write_tracks):
+    paths = write_tracks(2)
+    manifest = tmp_path / "run.jsonl"
+    BatchJob(paths[:1], str(manifest)).run()
+    # Simulate a crash in the middle of writing the second record
+    with open(manifest, "a") as f:
+        f.write(json.dumps({"path": paths[1], "status": "ok"})[:20])
+
+    job = BatchJob(paths, str(manifest))
+    assert job.pending() == paths[1:]
+    job.run()
+    records = list(read_manifest(str(manifest)))
+    assert [r["path"] for r in records] == paths
+
+def test_batch_dedup_reuses_identical_audio(tmp_path, write_tracks):
+    paths = write_tracks(1)
+    audio, sample_rate = sf.read(paths[0])
+    other = str(tmp_path / "other.wav")
+    sf.write(other, np.roll(audio, sample_rate // 3), sample_rate)
+    paths.append(other)
+    flac_copy = str(tmp_path / "track0 [128BPM].flac")
+    sf.write(flac_copy, audio, sample_rate)
+    renamed = str(tmp_path / "renamed.wav")
+    sf.write(renamed, audio * 0.5, sample_rate)  # Same audio at a lower gain
+    manifest = str(tmp_path / "run.jsonl")
+
+    progress = BatchJob(paths + [flac_copy, renamed], manifest, dedup=True, workers=2).run()
+    assert progress.completed == 4
+    assert progress.deduplicated == 2
+    assert progress.saved_seconds > 0
+    records = {r["path"]: r for r in read_manifest(manifest)}
+    assert records[flac_copy]["duplicate_of"] == paths[0]
+    assert records[flac_copy]["results"] == records[paths[0]]["results"]
+    assert "duplicate_of" not in records[paths[1]]
+
+    # A later run recognises new copies from the manifest
+    late_copy = str(tmp_path / "late.wav")
+    sf.write(late_copy, audio, sample_rate)
+    job = BatchJob(paths + [flac_copy, renamed, late_copy], manifest, dedup=True)
+    # Only offsets are kept; the original record is read back when reused
+    assert sorted(job.manifest.record_at(offset)["path"]
+                  for offset in job.manifest.fingerprints.values()) == sorted(paths)
+    assert job.run().deduplicated == 1
+    assert records[paths[0]]["results"] == \
+        {r["path"]: r for r in read_manifest(manifest)}[late_copy]["results"]
+
+def test_fingerprint_tells_apart_edits_sharing_an_intro(tmp_path, write_tracks):
+    from bpm_detector.fingerprint import audio_fingerprint
+    path = write_tracks(1)[0]
+    audio, sample_rate = sf.read(path)
+    edit = str(tmp_path / "edit.wav")
+    tail = slice(3 * sample_rate, None)
+    audio[tail] = np.roll(audio[tail], sample_rate // 5)
+    sf.write(edit, audio, sample_rate)
+    copy = str(tmp_path / "copy.flac")
+    sf.write(copy, sf.read(path)[0], sample_rate)
+
+    options = {"prefix_seconds": 1.6, "check_seconds": 1.0}
+    assert audio_fingerprint(path, **options) == audio_fingerprint(copy, **options)
+    assert audio_fingerprint(path, **options) != audio_fingerprint(edit, **options)
+
+def test_fingerprint_survives_bit_depth_and_codec(tmp_path, click_track):
+    from bpm_detector.fingerprint import audio_fingerprint
+    sample_rate = 22050
+    for seed in range(5):
+        # Quiet, so the noise floor between clicks sits near 16-bit resolution
+        track = click_track(100 + 15 * seed, 60, sample_rate, seed=seed)
+        track = 0.05 * track / np.max(np.abs(track))
+        fingerprints = set()
+        for name, subtype in (("float.wav", "FLOAT"), ("16.flac", "PCM_16"), ("24.wav", "PCM_24")):
+            path = str(tmp_path / name)
+            sf.write(path, track, sample_rate, subtype=subtype)
+            fingerprints.add(audio_fingerprint(path))
+        assert len(fingerprints) == 1 and None not in fingerprints
@@ -1,6 +1,6 @@
 import pytest
 import numpy as np
-from bpm_detector.detector import BPMDetector, BPMAlgorithm
+from bpm_detector.detector import BPMDetector, BPMAlgorithm, best_beat_grid
 
 def test_bpm_detector_initialization():
     detector = BPMDetector()
@@ -57,4 +57,145 @@ def test_detect_bpm_with_invalid_sample_rate():
     detector = BPMDetector()
     signal = np.array([0, 1, 0, 1])
     with pytest.raises(ValueError):
-        detector.detect(signal, -1, algorithm=BPMAlgorithm.AUTOCORRELATION) 
\ No newline at end of file
+        detector.detect(signal, -1, algorithm=BPMAlgorithm.AUTOCORRELATION) 
+
+def test_select_segments_skips_edges(tmp_path, click_track):
+    sf = pytest.importorskip("soundfile")
+    from bpm_detector.detector import SamplingStrategy, select_segments
+    sample_rate = 22050
+    path = tmp_path / "track.wav"
+    sf.write(str(path), click_track(128, 60, sample_rate), sample_rate)
+
+    segment_frames = 5 * sample_rate
+    with sf.SoundFile(str(path)) as f:
+        for strategy in SamplingStrategy:
+            starts = select_segments(f, strategy, 4, segment_frames, edge_skip=0.1)
+            assert len(starts) == 4
+            assert starts[0] >= int(f.frames * 0.1)
+            assert starts[-1] + segment_frames <= int(f.frames * 0.9)
+            assert all(b - a >= segment_frames for a, b in zip(starts, starts[1:]))
+
+        # Twelve segments do not fit in the middle 48 s; no overlapping ones
+        starts = select_segments(f, SamplingStrategy.SKIP_EDGES, 12, segment_frames)
+        assert len(starts) == 9
+        assert all(b - a >= segment_frames for a, b in zip(starts, starts[1:]))
+
+def test_sampled_detection_matches_full_track(tmp_path, click_track, monkeypatch):
+    sf = pytest.importorskip("soundfile")
+    from bpm_detector import detector
+    from bpm_detector.detector import SamplingStrategy, compare_results
+    sample_rate = 22050
+    path = tmp_path / "track.wav"
+    sf.write(str(path), click_track(128, 60, sample_rate), sample_rate)
+
+    full = BPMDetector().detect_file(str(path))
+    # Segment grids would be discarded, so none are fitted
+    monkeypatch.setattr(detector, "estimate_beat_grid", pytest.fail)
+    sampled = BPMDetector(sampling=SamplingStrategy.HIGH_ENERGY, num_segments=3,
+                          segment_duration=10).detect_file(str(path))
+
+    errors = compare_results(sampled, full)
+    assert errors[BPMAlgorithm.AUTOCORRELATION] <= 1
+    assert sampled[BPMAlgorithm.AUTOCORRELATION].confidence > 0
+
+def reference_onset_strength(y, sr, hop_length=512):
+    """The original full-resolution onset envelope, one band per FFT bin"""
+    from scipy import signal as sig
+    n_fft = 2048
+    freqs = np.linspace(0, sr/2, n_fft//2 + 1)
+    mel_f = 2595 * np.log10(1 + freqs/700)
+    mel_weights = np.exp(-0.5 * ((mel_f[:, np.newaxis] - mel_f) / (mel_f[1] - mel_f[0])) ** 2)
+    mel_weights = mel_weights / mel_weights.sum(axis=1, keepdims=True)
+    D = np.abs(sig.stft(y, nperseg=n_fft, noverlap=n_fft-hop_length)[2])
+    D = np.log1p(np.dot(mel_weights, D))
+    onset_env = np.maximum(0, np.diff(D, axis=1))
+    b, a = sig.butter(2, 0.1, btype='high', fs=sr/hop_length)
+    onset_env = sig.filtfilt(b, a, onset_env, axis=1)
+    onset_env = onset_env - onset_env.mean(axis=1, keepdims=True)
+    onset_env = onset_env / onset_env.std(axis=1, keepdims=True)
+    onset_env = np.mean(onset_env, axis=0)
+    return onset_env / np.max(np.abs(onset_env))
+
+def test_onset_strength_full_resolution_matches_reference(click_track):
+    from bpm_detector.detector import onset_strength
+    from bpm_detector.plan import get_analysis_plan
+    sample_rate = 22050
+    y = click_track(128, 10, sample_rate)
+    y = y / np.max(np.abs(y))
+    plan = get_analysis_plan(sample_rate, n_bands=None)
+    assert plan.n_bands == 1025
+    np.testing.assert_allclose(onset_strength(y, sample_rate, plan=plan),
+                               reference_onset_strength(y, sample_rate), atol=1e-10)
+
+def test_onset_strength_band_reduced_matches_reference(click_track):
+    from bpm_detector.detector import onset_strength, analyze_bpm_autocorrelation
+    from bpm_detector.plan import get_analysis_plan
+    sample_rate = 22050
+    y = click_track(140, 20, sample_rate)
+    y = y / np.max(np.abs(y))
+    banded = onset_strength(y, sample_rate, plan=get_analysis_plan(sample_rate, n_bands=64))
+    reference = reference_onset_strength(y, sample_rate)
+    assert banded.shape == reference.shape
+    assert np.corrcoef(banded, reference)[0, 1] > 0.99
+
+    full_plan = get_analysis_plan(sample_rate, n_bands=None)
+    assert analyze_bpm_autocorrelation(y, sample_rate) == pytest.approx(
+        analyze_bpm_autocorrelation(y, sample_rate, plan=full_plan), abs=0.01)
+
+def test_autocorrelation_resolves_fractional_tempo(click_track):
+    from bpm_detector.detector import analyze_bpm_autocorrelation
+    sample_rate = 44100
+    for bpm in (97.3, 139.6, 171.25):
+        # One lag step at hop 512 is 2-4 BPM at these tempos
+        estimate = analyze_bpm_autocorrelation(click_track(bpm, 30, sample_rate), sample_rate)
+        assert estimate == pytest.approx(bpm, abs=0.1)
+
+def test_quality_profiles(click_track):
+    from bpm_detector.profiles import get_profile
+    from bpm_detector.registry import get_spec
+    sample_rate = 44100
+    track = click_track(128, 20, sample_rate)
+
+    standard = BPMDetector(profile="standard").detect_all(track, sample_rate)
+    assert BPMDetector().detect_all(track, sample_rate) == standard
+
+    draft = BPMDetector(profile="draft").detect_all(track, sample_rate)
+    assert sorted(get_spec(key).name for key in draft) == sorted(get_profile("draft").algorithms)
+    assert abs(draft[BPMAlgorithm.AUTOCORRELATION].bpm - 128) < 2
+
+    precise = BPMDetector(profile="precise")
+    assert len(precise.plan_for(sample_rate).kde_grid) == 2000
+    assert abs(precise.detect_all(track, sample_rate)[BPMAlgorithm.AUTOCORRELATION].bpm - 128) < 1
+
+    with pytest.raises(ValueError):
+        BPMDetector(profile="fast")
+
+def test_beat_grid_aligns_with_clicks(click_track):
+    from bpm_detector.batch import results_from_dict, results_to_dict
+    sample_rate = 22050
+    start = 0.3
+    track = click_track(126, 30, sample_rate)
+    track = np.concatenate([0.01 * np.random.default_rng(1).standard_normal(int(start * sample_rate)),
+                            track])
+    # Accent the first beat of every bar
+    beat = 60.0 / 126
+    for bar in np.arange(start, len(track) / sample_rate - 0.05, 4 * beat):
+        first = int(bar * sample_rate)
+        track[first:first + int(0.03 * sample_rate)] *= 3
+
+    results = BPMDetector().detect_all(track, sample_rate)
+    # Whichever result is reported, its grid is at its own tempo
+    assert all(result.beat_grid.bpm == result.bpm for result in results.values() if result.bpm > 0)
+    grid = best_beat_grid(results)
+    assert grid.bpm == pytest.approx(126, abs=0.1)
+    assert grid.offset == pytest.approx(start, abs=0.015)
+    assert len(grid.beats) == grid.count == int((len(track) / sample_rate - start) / beat) + 1
+    # No drift over the whole track
+    assert grid.beats[-1] == pytest.approx(start + (grid.count - 1) * beat, abs=0.02)
+    assert grid.downbeats[0] == pytest.approx(start, abs=0.015)
+    assert results_from_dict(results_to_dict(results)) == results
+
+    results = BPMDetector(beats_per_bar=None).detect_all(track, sample_rate)
+    assert len(best_beat_grid(results).downbeats) == 0
+    results = BPMDetector(beat_grid=False).detect_all(track, sample_rate)
+    assert all(result.beat_grid is None for result in results.values())
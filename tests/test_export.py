@@ -0,0 +1,61 @@
+import csv
+import json
+import sys
+import pytest
+from bpm_detector.batch import BatchJob, read_manifest
+from bpm_detector.detector import DECODE_TIMING
+from bpm_detector.export import JSONLWriter, algorithm_columns, open_writer
+
+def test_batch_records_stream_to_jsonl_and_csv(tmp_path, write_tracks):
+    paths = write_tracks(3)
+    BatchJob(paths, str(tmp_path / "run.jsonl")).run()
+    records = list(read_manifest(str(tmp_path / "run.jsonl")))
+    assert set(records[0]["timings"]) == set(records[0]["results"]) | {DECODE_TIMING}
+    assert records[0]["metadata"]["sample_rate"] == 22050
+
+    for name in ("out.jsonl", "out.csv"):
+        with open_writer(str(tmp_path / name), batch_size=2) as writer:
+            for record in records:
+                writer.write(record)
+            assert writer.rows_written == 2  # Third row still buffered
+        assert writer.rows_written == 3
+
+    rows = [json.loads(line) for line in open(tmp_path / "out.jsonl")]
+    with open(tmp_path / "out.csv", newline="") as f:
+        csv_rows = list(csv.DictReader(f))
+    assert [row["path"] for row in rows] == [row["path"] for row in csv_rows] == paths
+    assert set(algorithm_columns()) <= set(csv_rows[0])
+    assert float(csv_rows[0]["autocorrelation_bpm"]) == rows[0]["autocorrelation_bpm"]
+    assert rows[0]["autocorrelation_seconds"] > 0
+    assert float(csv_rows[0]["decode_seconds"]) == rows[0]["decode_seconds"] > 0
+    assert rows[0]["channels"] == 1
+
+def test_failed_records_export_without_results(tmp_path):
+    with JSONLWriter(str(tmp_path / "out.jsonl")) as writer:
+        writer.write({"path": "broken.wav", "status": "error", "error": "bad header"})
+    row = json.loads(open(tmp_path / "out.jsonl").read())
+    assert row == {"path": "broken.wav", "status": "error", "error": "bad header"}
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_writer(str(tmp_path / "out.xlsx"))
+
+def test_parquet_export(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with open_writer(str(tmp_path / "out.parquet"), batch_size=1) as writer:
+        writer.write({"path": "a.wav", "status": "ok",
+                      "results": {"autocorrelation": {"bpm": 120.0, "confidence": 0.9}}})
+        writer.write({"path": "b.wav", "status": "error", "error": "bad header"})
+    table = pq.read_table(str(tmp_path / "out.parquet"))
+    assert table.column("autocorrelation_bpm").to_pylist() == [120.0, None]
+
+def test_resumed_batch_exports_earlier_runs_too(tmp_path, write_tracks, monkeypatch):
+    from bpm_detector.cli import main
+    paths = write_tracks(3)
+    manifest, export = str(tmp_path / "run.jsonl"), str(tmp_path / "out.csv")
+    for files in (paths[:2], paths):
+        monkeypatch.setattr(sys, "argv", ["bpm-detector", *files, "--manifest", manifest,
+                                          "--export", export])
+        assert main() == 0
+    with open(export, newline="") as f:
+        assert [row["path"] for row in csv.DictReader(f)] == paths
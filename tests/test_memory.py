@@ -0,0 +1,69 @@
+import threading
+import pytest
+import numpy as np
+from bpm_detector.batch import BatchJob
+from bpm_detector.detector import BPMDetector
+from bpm_detector.memory import MemoryBudget, estimate_peak_bytes, read_mono
+
+sf = pytest.importorskip("soundfile")
+
+def test_chunked_decode_matches_full_decode(tmp_path, click_track):
+    sample_rate = 22050
+    pulse = 0.2 * click_track(120, 16, sample_rate)  # Longer than one decode chunk
+    path = str(tmp_path / "stereo.wav")
+    sf.write(path, np.stack([pulse, 0.5 * pulse], axis=1), sample_rate)
+
+    with sf.SoundFile(path) as f:
+        assert np.array_equal(read_mono(f, chunk_frames=1000), np.mean(sf.read(path)[0], axis=1))
+
+    full = BPMDetector().detect_file(path)
+    chunked_detector = BPMDetector(memory_budget=1)
+    assert chunked_detector.detect_file(path) == full
+    assert chunked_detector.estimate_file_peak(path) < BPMDetector().estimate_file_peak(path)
+
+def test_estimate_grows_with_length_and_channels():
+    minute = 60 * 44100
+    assert estimate_peak_bytes(10 * minute, 2) > estimate_peak_bytes(minute, 2)
+    assert estimate_peak_bytes(minute, 2) > estimate_peak_bytes(minute, 1)
+    # The chunked decode no longer scales with the channel count
+    assert estimate_peak_bytes(10 * minute, 6, chunked=True) < estimate_peak_bytes(10 * minute, 6)
+
+def test_budget_admits_work_that_fits():
+    budget = MemoryBudget(100)
+    assert budget.fits(500)  # Anything runs on an idle budget
+    started = threading.Event()
+
+    def big():
+        with budget.reserve(500):  # Larger than the budget
+            started.set()
+
+    with budget.reserve(60):
+        assert budget.fits(30) and not budget.fits(50)
+        with budget.reserve(30):
+            assert (budget.reserved, budget.running) == (90, 2)
+        thread = threading.Thread(target=big)
+        thread.start()
+        assert not started.is_set()  # Only runs on its own
+        assert budget.reserved == 60
+    assert started.wait(timeout=10)
+    thread.join()
+    assert (budget.reserved, budget.running) == (0, 0)
+
+def test_sampled_estimate_follows_detect_file(write_tracks):
+    from bpm_detector.detector import SamplingStrategy
+    path = write_tracks(1)[0]  # 4 s
+    full = BPMDetector().estimate_file_peak(path)
+    # Shorter than the segments together, so detect_file decodes all of it
+    sampled = BPMDetector(sampling=SamplingStrategy.SKIP_EDGES, num_segments=4,
+                          segment_duration=1.0)
+    assert sampled.estimate_file_peak(path) == full
+    sampled.num_segments = 1
+    assert sampled.estimate_file_peak(path) < full
+
+def test_batch_respects_memory_budget(tmp_path, write_tracks):
+    paths = write_tracks(3)
+    detector = BPMDetector()
+    budget = detector.estimate_file_peak(paths[0])  # One file at a time
+    progress = BatchJob(paths, str(tmp_path / "run.jsonl"), detector, workers=2,
+                        memory_budget=budget).run()
+    assert progress.completed == 3
@@ -0,0 +1,67 @@
+import json
+import pytest
+from bpm_detector.batch import BatchJob
+from bpm_detector.metrics import (ALGORITHM_SECONDS, CACHE_REQUESTS, DECODE_SECONDS, ERRORS,
+                                  FILES, PEAK_RESIDENT_BYTES, QUEUE_DEPTH, MetricsRegistry,
+                                  MetricsReporter)
+from bpm_detector.service import AnalysisService
+
+def test_prometheus_text_format():
+    metrics = MetricsRegistry()
+    metrics.counter("jobs_total", "Jobs").inc(kind="a")
+    metrics.counter("jobs_total").inc(2, kind='say "hi"')
+    histogram = metrics.histogram("wait_seconds", "Wait", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{kind="a"} 1.0' in lines
+    assert 'jobs_total{kind="say \\"hi\\""} 2.0' in lines
+    assert 'wait_seconds_bucket{le="0.1"} 1' in lines
+    assert 'wait_seconds_bucket{le="1.0"} 2' in lines
+    assert 'wait_seconds_bucket{le="+Inf"} 3' in lines
+    assert "wait_seconds_count 3" in lines
+    assert any(line.startswith(f'{PEAK_RESIDENT_BYTES}{{process="self"}}') for line in lines)
+
+    with pytest.raises(ValueError):
+        metrics.gauge("jobs_total")
+
+def test_batch_metrics_and_reporter(tmp_path, write_tracks):
+    paths = write_tracks(2)
+    broken = tmp_path / "broken.wav"
+    broken.write_bytes(b"not audio")
+    metrics = MetricsRegistry()
+    prom_path, json_path = str(tmp_path / "bpm.prom"), str(tmp_path / "metrics.jsonl")
+
+    with MetricsReporter(metrics, prom_path, json_path, interval=3600):
+        BatchJob(paths + [str(broken)], str(tmp_path / "run.jsonl"), max_retries=0,
+                 dedup=True, metrics=metrics).run()
+
+    assert metrics.get(FILES).value(status="ok") == 2
+    assert metrics.get(FILES).value(status="error") == 1
+    assert metrics.get(ERRORS).total() == 1
+    assert metrics.get(QUEUE_DEPTH).samples() == [((), 0.0)]
+    # write_tracks writes identical audio, so the second file is a dedup hit
+    assert metrics.get(CACHE_REQUESTS).value(cache="dedup", result="hit") == 1
+    assert metrics.get(DECODE_SECONDS).samples()[0][2] == 1
+    assert {dict(key)["algorithm"] for key, *_ in metrics.get(ALGORITHM_SECONDS).samples()} \
+        >= {"autocorrelation", "energy flux", "web style"}
+
+    assert "bpm_files_total{status=\"ok\"} 2.0" in open(prom_path).read()
+    snapshot = json.loads(open(json_path).readlines()[-1])
+    assert snapshot["metrics"][FILES]["type"] == "counter"
+    assert snapshot["files_per_second"] > 0
+    assert snapshot["cache_hit_rate"] == pytest.approx(1 / 3)  # The broken file is a miss
+    assert snapshot["error_rate"] == pytest.approx(1 / 3)
+
+def test_service_records_cache_hits(tmp_path, write_tracks):
+    path = write_tracks(1)[0]
+    with AnalysisService(workers=1) as service:
+        service.submit_file(path).result(timeout=60)
+        service.submit_file(path).result(timeout=60)
+    requests = service.metrics.get(CACHE_REQUESTS)
+    assert requests.value(cache="results", result="miss") == 1
+    assert requests.value(cache="results", result="hit") == 1
+    assert service.metrics.get(FILES).value(status="ok") == 1
+    assert "bpm_request_seconds_count 1" in service.metrics.to_prometheus()
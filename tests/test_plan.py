@@ -0,0 +1,22 @@
+import pytest
+from bpm_detector.plan import get_analysis_plan
+
+def test_plan_is_memoized():
+    plan = get_analysis_plan(44100, min_bpm=92, max_bpm=184)
+    assert get_analysis_plan(44100, min_bpm=92, max_bpm=184) is plan
+    assert get_analysis_plan(48000, min_bpm=92, max_bpm=184) is not plan
+    # Positional, keyword and default arguments share one plan
+    assert get_analysis_plan(44100, 512, 2048, 92, 184) is plan
+    assert get_analysis_plan(44100) is plan
+    assert get_analysis_plan(sample_rate=44100, hop_length=512) is plan
+
+def test_plan_arrays_are_read_only():
+    plan = get_analysis_plan(44100)
+    with pytest.raises(ValueError):
+        plan.band_weights[0, 0] = 1.0
+
+def test_plan_lag_bounds_cover_tempo_range():
+    plan = get_analysis_plan(44100, hop_length=512, min_bpm=92, max_bpm=184)
+    bpm_at = lambda lag: 60.0 * 44100 / (512 * lag)
+    assert bpm_at(plan.min_lag) >= 184
+    assert bpm_at(plan.max_lag + 1) <= 92
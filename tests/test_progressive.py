@@ -0,0 +1,43 @@
+import pytest
+import numpy as np
+from scipy import signal
+from bpm_detector.detector import BPMDetector, BPMAlgorithm
+from bpm_detector.progressive import StreamResampler
+
+sf = pytest.importorskip("soundfile")
+
+def test_stream_resampler_matches_resample_poly():
+    x = np.random.default_rng(0).standard_normal(44100 * 3 + 17)
+    resampler = StreamResampler(44100, 11025)
+    chunks = [resampler.push(x[i:i + 5000]) for i in range(0, len(x), 5000)]
+    chunks.append(resampler.push(np.zeros(0), final=True))
+    np.testing.assert_allclose(np.concatenate(chunks), signal.resample_poly(x, 1, 4), atol=1e-12)
+
+@pytest.mark.parametrize("profile", ["standard", "draft"])
+def test_progressive_updates_end_with_detect_file(tmp_path, profile, click_track):
+    sample_rate = 22050
+    track = click_track(128.0, 45, sample_rate)
+    path = str(tmp_path / "long.wav")
+    sf.write(path, np.column_stack((track, 0.5 * track)), sample_rate)
+
+    detector = BPMDetector(profile=profile)
+    updates = list(detector.detect_file_progressive(path, first_seconds=5.0))
+    seconds = [s for s, _, _ in updates]
+    assert [final for _, _, final in updates] == [False] * (len(updates) - 1) + [True]
+    assert 5.0 <= seconds[0] < 10.0
+    assert seconds == sorted(seconds) and seconds[-1] == pytest.approx(45.0)
+    assert abs(updates[0][1][BPMAlgorithm.AUTOCORRELATION].bpm - 128.0) < 1.0
+
+    # The final update is the full analysis, not an approximation of it
+    assert updates[-1][1] == detector.detect_file(path)
+
+def test_progressive_timings_match_detect_file_keys(tmp_path, click_track):
+    from bpm_detector.detector import DECODE_TIMING
+    from bpm_detector.registry import get_spec
+    path = str(tmp_path / "track.wav")
+    sf.write(path, click_track(128.0, 20, 22050), 22050)
+    timings = {}
+    *_, (_, results, _) = BPMDetector().detect_file_progressive(path, first_seconds=5.0,
+                                                                  timings=timings)
+    assert set(timings) == {get_spec(key).name for key in results} | {DECODE_TIMING}
+    assert all(seconds > 0 for seconds in timings.values())
@@ -0,0 +1,40 @@
+from bpm_detector import features as features_module
+from bpm_detector.detector import BPMDetector, BPMAlgorithm
+from bpm_detector.registry import (available_algorithms, register_algorithm,
+                                   schedule_algorithms, unregister_algorithm,
+                                   ONSET_ENVELOPE, FRAME_ENERGIES)
+
+def test_builtin_algorithms_are_registered():
+    keys = [spec.key for spec in available_algorithms()]
+    assert set(keys) == set(BPMAlgorithm)
+
+def test_schedule_runs_algorithms_sharing_inputs_together():
+    a = register_algorithm("plugin a", lambda f, lo, hi: 0, needs=(ONSET_ENVELOPE,), cost=0.01)
+    b = register_algorithm("plugin b", lambda f, lo, hi: 0, needs=(FRAME_ENERGIES,), cost=0.5)
+    try:
+        order = [spec.name for spec in schedule_algorithms(available_algorithms())]
+        # Once the envelope exists, autocorrelation is cheaper than anything new
+        assert order.index("plugin a") + 1 == order.index(BPMAlgorithm.AUTOCORRELATION.value)
+        assert order.index(BPMAlgorithm.WEB_STYLE.value) < order.index("plugin b")
+    finally:
+        unregister_algorithm(a.key)
+        unregister_algorithm(b.key)
+
+def test_plugin_results_share_intermediates(monkeypatch, click_track):
+    calls = []
+    producer = features_module._PRODUCERS[ONSET_ENVELOPE]
+    monkeypatch.setitem(features_module._PRODUCERS, ONSET_ENVELOPE,
+                        lambda f: calls.append(1) or producer(f))
+
+    def estimate(features, min_bpm, max_bpm):
+        assert len(features.get(ONSET_ENVELOPE)) > 0
+        return 120.0
+
+    spec = register_algorithm("envelope plugin", estimate, needs=(ONSET_ENVELOPE,))
+    try:
+        results = BPMDetector().detect_all(click_track(120, 8, 22050), 22050)
+    finally:
+        unregister_algorithm(spec.key)
+    assert results["envelope plugin"].bpm == 120.0
+    assert BPMAlgorithm.AUTOCORRELATION in results
+    assert len(calls) == 1
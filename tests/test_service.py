@@ -0,0 +1,114 @@
+import json
+import os
+import signal
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import numpy as np
+from bpm_detector.service import AnalysisService, create_server
+
+def post(url, data, content_type="application/json"):
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+@pytest.fixture
+def server():
+    with AnalysisService(workers=1, max_batch=4, max_wait=0.05) as service:
+        httpd = create_server(service)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{httpd.server_port}"
+        httpd.shutdown()
+        httpd.server_close()
+
+def test_service_batches_and_caches(server, tmp_path, write_tracks):
+    paths = write_tracks(4)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(
+            lambda path: post(f"{server}/analyze", json.dumps({"path": path}).encode()), paths))
+    assert all("autocorrelation" in response["results"] for response in responses)
+
+    again = post(f"{server}/analyze", json.dumps({"path": paths[0]}).encode())
+    assert again == responses[0]
+
+    with urllib.request.urlopen(f"{server}/stats") as response:
+        stats = json.loads(response.read())
+    assert stats["requests"] == 5
+    assert stats["cache_hits"] == 1
+    assert stats["batches"] < 4  # Concurrent requests were coalesced
+    assert stats["queue_depth"] == 0
+    assert stats["latency_p99_ms"] >= stats["latency_p50_ms"]
+
+def test_service_accepts_pcm(server, click_track):
+    sample_rate = 22050
+    audio = click_track(120, 4, sample_rate).astype("<f4")
+    stereo = np.repeat(audio[:, None], 2, axis=1)
+    response = post(f"{server}/analyze/pcm?sample_rate={sample_rate}&channels=2",
+                    stereo.tobytes(), "application/octet-stream")
+    assert response["results"]["autocorrelation"]["bpm"] > 0
+
+def test_service_reports_bad_requests(server, tmp_path):
+    with pytest.raises(urllib.error.HTTPError) as info:
+        post(f"{server}/analyze", json.dumps({"path": str(tmp_path / "missing.wav")}).encode())
+    assert info.value.code == 400
+    for body in (b"[]", b'"x"', b'{"path": 5}', b"{"):
+        with pytest.raises(urllib.error.HTTPError) as info:
+            post(f"{server}/analyze", body)
+        assert info.value.code == 400
+
+def test_stopped_service_fails_pending_requests(tmp_path, write_tracks):
+    path = write_tracks(1)[0]
+    service = AnalysisService(workers=1).start()
+    service._queue.put(None)  # Requests behind the sentinel are never batched
+    late = service.submit_file(path)
+    service.stop()
+    with pytest.raises(RuntimeError):
+        late.result(timeout=10)
+    with pytest.raises(RuntimeError):
+        service.submit_file(path).result(timeout=10)
+
+def test_service_replaces_a_pool_whose_worker_died(click_track):
+    sample_rate = 22050
+    with AnalysisService(workers=1, use_processes=True) as service:
+        service.submit_pcm(click_track(120, 4, sample_rate), sample_rate).result(timeout=60)
+        for process in list(service._executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        # Answered either way: failed with the dead worker, or run on a new pool
+        try:
+            service.submit_pcm(click_track(120, 4, sample_rate, seed=1),
+                               sample_rate).result(timeout=60)
+        except RuntimeError:
+            pass
+        results = service.submit_pcm(click_track(120, 4, sample_rate, seed=2),
+                                     sample_rate).result(timeout=60)
+        assert results
+        assert service._batcher.is_alive()
+        assert service._shared.active == 0
+
+def test_requests_racing_stop_all_resolve():
+    service = AnalysisService(workers=2, max_wait=0.0).start()
+    futures = []
+    submitting = threading.Event()
+
+    def submit(seed):
+        audio = np.random.default_rng(seed).standard_normal(2048)
+        while True:
+            futures.append(service.submit_pcm(audio, 22050))
+            submitting.set()
+            if futures[-1].done() and isinstance(futures[-1].exception(), RuntimeError) \
+                    and "stopped" in str(futures[-1].exception()):
+                return
+            audio = audio + 1.0
+
+    threads = [threading.Thread(target=submit, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    submitting.wait()
+    service.stop()
+    for thread in threads:
+        thread.join()
+    for future in futures:
+        future.exception(timeout=10)  # Resolved, with a result or an error
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import pytest
+import numpy as np
+from bpm_detector.batch import read_manifest
+from bpm_detector.sharding import LockDirectoryClaimer, merge_manifests, select_shard
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+def test_hash_shards_partition_files():
+    files = [f"/nas/music/{i:04d}.flac" for i in range(200)]
+    shards = [select_shard(files, i, 4) for i in range(4)]
+    assert sorted(sum(shards, [])) == files
+    assert all(shards)  # Every shard gets some work
+    assert select_shard(files, 2, 4) == shards[2]
+
+def test_claims_are_exclusive(tmp_path):
+    a = LockDirectoryClaimer(str(tmp_path), node_id="a")
+    b = LockDirectoryClaimer(str(tmp_path), node_id="b", stale_after=3600)
+    assert a.claim("/x.wav")
+    assert a.claim("/x.wav")  # Own claim survives a restart
+    assert not b.claim("/x.wav")
+    a.complete("/x.wav")
+    assert not a.claim("/x.wav")
+    assert not b.claim("/x.wav")
+
+    stealer = LockDirectoryClaimer(str(tmp_path), node_id="c", stale_after=0)
+    assert a.claim("/y.wav")
+    assert stealer.claim("/y.wav")  # Abandoned claim taken over
+    a.complete("/y.wav")  # Left to the new owner
+    assert not b.claim("/y.wav")
+    stealer.complete("/y.wav")
+    assert not a.claim("/y.wav")
+
+def test_heartbeat_keeps_live_claims(tmp_path):
+    import time
+    a = LockDirectoryClaimer(str(tmp_path), node_id="a", heartbeat=0.05)
+    b = LockDirectoryClaimer(str(tmp_path), node_id="b", stale_after=60)
+    assert a.claim("/x.wav")
+    lock = a._paths("/x.wav")[0]
+    os.utime(lock, (0, 0))  # As if analysis had been running for a long time
+    time.sleep(0.3)
+    assert time.time() - os.path.getmtime(lock) < 60
+    assert not b.claim("/x.wav")
+    assert LockDirectoryClaimer(str(tmp_path)).node_id == LockDirectoryClaimer(str(tmp_path)).node_id
+
+def test_work_stealing_nodes_do_not_duplicate_work(tmp_path):
+    sf = pytest.importorskip("soundfile")
+    music = tmp_path / "music"
+    music.mkdir()
+    t = np.arange(22050) / 22050
+    for i in range(12):
+        sf.write(str(music / f"{i:02d}.wav"), np.sin(2 * np.pi * (200 + 10 * i) * t), 22050)
+
+    env = dict(os.environ, PYTHONPATH=SRC)
+    nodes = [subprocess.Popen(
+        [sys.executable, "-m", "bpm_detector.cli", str(music),
+         "--manifest", str(tmp_path / f"node{i}.jsonl"),
+         "--claim-dir", str(tmp_path / "locks"), "--node-id", f"node{i}", "--max-retries", "0"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) for i in range(3)]
+    for node in nodes:
+        node.wait(timeout=120)
+
+    manifests = [str(tmp_path / f"node{i}.jsonl") for i in range(3)]
+    processed = [record["path"] for m in manifests for record in read_manifest(m)]
+    assert len(processed) == len(set(processed)) == 12
+
+    stats = merge_manifests(manifests, str(tmp_path / "merged.jsonl"))
+    assert stats["files"] == 12
+    assert stats["duplicates"] == 0
+    assert len(list(read_manifest(str(tmp_path / "merged.jsonl")))) == 12
+
+def test_takeover_backs_off_from_a_lock_stolen_meanwhile(tmp_path, monkeypatch):
+    dead = LockDirectoryClaimer(str(tmp_path), node_id="dead")
+    a = LockDirectoryClaimer(str(tmp_path), node_id="a", stale_after=60)
+    b = LockDirectoryClaimer(str(tmp_path), node_id="b", stale_after=60)
+    assert dead.claim("/x.wav")
+    lock = dead._paths("/x.wav")[0]
+    os.utime(lock, (0, 0))
+    rename = os.rename
+
+    def b_steals_first(src, dst):
+        # b takes the stale lock over after a judged it stale, before a renames it
+        if dst.endswith(".stale-a"):
+            assert b.claim("/x.wav")
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", b_steals_first)
+    assert not a.claim("/x.wav")
+    assert a._owner(lock) == "b"
+    assert os.listdir(str(tmp_path)) == [os.path.basename(lock)]  # No .stale-* left behind
@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import numpy as np
+from bpm_detector.detector import BPMDetector
+from bpm_detector.service import AnalysisService
+from bpm_detector.shm import (_NAMESPACE, SharedMemoryPool, attach, read_shared,
+                              remove_orphans)
+
+def _sum_shared(handle):
+    with attach(handle) as view:
+        return float(view.sum()), view.flags.writeable
+
+def test_workers_read_published_arrays():
+    audio = np.random.default_rng(0).standard_normal((1000, 2))
+    with SharedMemoryPool() as pool:
+        handle = pool.publish(audio)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            total, writeable = executor.submit(_sum_shared, handle).result()
+        assert total == pytest.approx(audio.sum())
+        assert not writeable
+
+        # Unlinked with the last reference
+        pool.acquire(handle)
+        pool.release(handle)
+        assert pool.active == 1
+        pool.release(handle)
+        assert pool.active == 0
+        with pytest.raises(FileNotFoundError):
+            _sum_shared(handle)
+
+def test_read_shared_decodes_into_segment(tmp_path, write_tracks):
+    import soundfile as sf
+
+    path = write_tracks(1)[0]
+    with SharedMemoryPool() as pool:
+        handle, sample_rate = read_shared(pool, path)
+        with attach(handle) as view:
+            np.testing.assert_array_equal(view, sf.read(path, always_2d=True)[0])
+    assert pool.active == 0
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm") or _NAMESPACE == "0",
+                    reason="needs /dev/shm and PID namespaces")
+def test_remove_orphans_of_dead_publisher():
+    with SharedMemoryPool(prefix="bpmtest") as pool:
+        live = pool.publish(np.zeros(4))
+        # A segment of a process that no longer exists, and one published
+        # from another PID namespace, whose PIDs mean nothing here
+        dead = f"bpmtest{_NAMESPACE}_999999999_0"
+        foreign = "bpmtestforeign_999999999_0"
+        for name in (dead, foreign):
+            with open(f"/dev/shm/{name}", "wb") as f:
+                f.write(bytes(32))
+        try:
+            assert remove_orphans("bpmtest") == [dead]
+            assert os.path.exists(f"/dev/shm/{live.name}")
+        finally:
+            os.unlink(f"/dev/shm/{foreign}")
+
+def test_service_hands_pcm_to_processes_in_shared_memory(click_track):
+    sample_rate = 22050
+    audio = click_track(120, 4, sample_rate)
+    with AnalysisService(workers=1, use_processes=True) as service:
+        results = service.submit_pcm(audio, sample_rate).result(timeout=60)
+        assert service._shared.active == 0
+    assert results == BPMDetector().detect_all(audio, sample_rate)
@@ -0,0 +1,26 @@
+import pytest
+import numpy as np
+from scipy import signal
+from bpm_detector import spectral
+
+@pytest.mark.parametrize("length", [2048, 10000, 44100])
+def test_stft_magnitude_matches_scipy(length, monkeypatch):
+    monkeypatch.setattr(spectral, "BLOCK_FRAMES", 16)  # Exercise block boundaries
+    y = np.random.default_rng(0).standard_normal(length)
+    window = signal.get_window('hann', 2048)
+    expected = np.abs(signal.stft(y, window=window, nperseg=2048, noverlap=2048 - 512)[2])
+    np.testing.assert_allclose(spectral.stft_magnitude(y, window, 512, workers=2),
+                               expected, atol=1e-12)
+
+def test_spectral_flux_matches_frame_loop(monkeypatch):
+    monkeypatch.setattr(spectral, "BLOCK_FRAMES", 7)
+    y = np.random.default_rng(1).standard_normal(20000)
+    n_frames = len(y) // 512
+    expected = np.zeros(n_frames - 1)
+    for i in range(len(expected)):
+        frame1 = np.pad(y[i * 512:i * 512 + 1024], (0, 2048 - len(y[i * 512:i * 512 + 1024])))
+        frame2 = np.pad(y[(i + 1) * 512:(i + 1) * 512 + 1024],
+                        (0, 2048 - len(y[(i + 1) * 512:(i + 1) * 512 + 1024])))
+        expected[i] = np.sum(np.maximum(0, np.abs(np.fft.rfft(frame2)) - np.abs(np.fft.rfft(frame1))))
+    np.testing.assert_allclose(spectral.spectral_flux(y, 1024, 512, 2048, n_frames, workers=2),
+                               expected, rtol=1e-10)
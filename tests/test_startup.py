@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+def loaded_modules(code):
+    """Run code in a fresh interpreter and return the modules it imported"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    proc = subprocess.run(
+        [sys.executable, "-c", code + "\nimport sys; print(' '.join(sys.modules))"],
+        env=env, capture_output=True, text=True, check=True)
+    return set(proc.stdout.split())
+
+def test_package_import_is_lazy():
+    modules = loaded_modules("import bpm_detector; bpm_detector.BPMAlgorithm")
+    assert "numpy" not in modules
+    assert "scipy" not in modules
+    assert "soundfile" not in modules
+
+def test_cli_help_does_not_import_scientific_stack():
+    modules = loaded_modules(
+        "import sys; sys.argv = ['bpm-detector', '--help']\n"
+        "from bpm_detector.cli import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass")
+    assert "numpy" not in modules
+    assert "scipy" not in modules
+
+def test_lazy_attributes_resolve():
+    modules = loaded_modules("from bpm_detector import BPMDetector, analyze_bpm")
+    assert "bpm_detector.detector" in modules
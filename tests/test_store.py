@@ -0,0 +1,48 @@
+import os
+import shutil
+import numpy as np
+from bpm_detector.detector import BPMAlgorithm, BPMDetector
+from bpm_detector.plan import get_analysis_plan
+from bpm_detector.store import STORE_VERSION, EnvelopeStore, content_hash
+
+def sidecars(directory):
+    return [name for _, _, files in os.walk(directory) for name in files]
+
+def test_stored_envelopes_replace_decoding(tmp_path, monkeypatch, write_tracks):
+    path = write_tracks(1)[0]
+    store = EnvelopeStore(str(tmp_path / "cache"))
+    fresh = BPMDetector().detect_file(path)
+    assert BPMDetector(store=store).detect_file(path) == fresh
+    assert len(sidecars(tmp_path / "cache")) == 1
+
+    def no_decoding(*args):
+        raise AssertionError("audio was decoded")
+    monkeypatch.setattr(BPMDetector, "_prepare", no_decoding)
+
+    # Same file under another name, and another tempo range, from the sidecar
+    copy = str(tmp_path / "copy.wav")
+    shutil.copy(path, copy)
+    assert BPMDetector(store=store).detect_file(copy) == fresh
+    wide = BPMDetector(min_bpm=60, max_bpm=200, store=store).detect_file(path)
+    assert BPMAlgorithm.AUTOCORRELATION in wide
+    assert len(sidecars(tmp_path / "cache")) == 1
+
+def test_store_ignores_other_versions_and_front_ends(tmp_path):
+    store = EnvelopeStore(str(tmp_path))
+    plan = get_analysis_plan(22050)
+    store.save("ab" * 20, plan, {"onset_envelope": np.arange(4.0), "unrelated": np.zeros(3)})
+    assert list(store.load("ab" * 20, plan)) == ["onset_envelope"]
+    assert store.load("ab" * 20, get_analysis_plan(22050, hop_length=256)) == {}
+
+    store.save("cd" * 20, plan, {"onset_envelope": np.arange(4.0)})
+    np.savez_compressed(store.path_for("cd" * 20, plan), store_version=STORE_VERSION + 1,
+                        onset_envelope=np.arange(4.0))
+    assert store.load("cd" * 20, plan) == {}
+
+def test_content_hash_follows_content(tmp_path):
+    a, b = tmp_path / "a.bin", tmp_path / "b.bin"
+    a.write_bytes(b"x" * 3000000)
+    b.write_bytes(b"x" * 3000000)
+    assert content_hash(str(a)) == content_hash(str(b))
+    b.write_bytes(b"x" * 2999999 + b"y")
+    assert content_hash(str(a)) != content_hash(str(b))